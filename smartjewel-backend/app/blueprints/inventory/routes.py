@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, current_app
 from bson import ObjectId
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.utils.authz import require_permissions, require_any_role
+from app.blueprints.rentals.routes import PRODUCT_SNAPSHOT_FIELDS, sync_rental_product
 
 
 bp = Blueprint("inventory", __name__, url_prefix="/inventory")
@@ -618,6 +619,10 @@ def update_item(item_id):
         
         if res.matched_count == 0:
             return jsonify({"error": "not_found"}), 404
+
+        # Keep the product snapshot on rental items in sync
+        if any(k in update for k in PRODUCT_SNAPSHOT_FIELDS):
+            sync_rental_product(db, oid)
             
         return jsonify({"updated": True})
         
@@ -639,6 +644,7 @@ def delete_item(item_id):
     res = db.items.update_one({"_id": oid}, {"$set": {"status": "deleted", "updated_at": _now(db)}})
     if res.matched_count == 0:
         return jsonify({"error": "not_found"}), 404
+    sync_rental_product(db, oid)
     return jsonify({"deleted": True})
 
 
@@ -52,7 +52,11 @@ def get_gold_rate():
 @bp.post("/refresh-gold-rate")
 @jwt_required()  # require auth; front-end admin will call this
 def refresh_gold_rate():
-    """Force-refresh the gold rate from GoldAPI (spends one API call)."""
+    """Refresh the gold rate from GoldAPI and reprice products.
+
+    A GoldAPI result younger than 30 minutes is reused instead of spending
+    another API call.
+    """
     db = current_app.extensions['mongo_db']
     result = GoldRateService.refresh_and_reprice(db)
     if not result.get("success"):
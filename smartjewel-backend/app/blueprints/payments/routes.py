@@ -9,6 +9,7 @@ from app.extensions import db
 from flask import current_app
 from datetime import datetime
 from app.services.whatsapp_service import get_whatsapp_service
+from app.utils.order_search import customer_search_terms
 try:
     from bson import ObjectId  # Mongo ObjectId for safe serialization
 except Exception:
@@ -249,9 +250,10 @@ def create_razorpay_order():
                     "currency": currency,
                     "receipt": receipt,
                     "customer": customer,
+                    "customer_search": customer_search_terms(customer),
                     "items": items,
                     "updated_at": _now(db),
-                }, "$setOnInsert": {"status": "created", "created_at": _now(db)}},
+                }, "$setOnInsert": {"status": "created", "created_at": _now(db), "createdAt": _now(db)}},
                 upsert=True
             )
             print(f"Order upserted to database: {receipt}")
@@ -410,9 +412,11 @@ def verify_razorpay_signature():
                     "amount": order_doc.get("amount", 0),
                     "currency": order_doc.get("currency", "INR"),
                     "customer": customer_data,
+                    "customer_search": customer_search_terms(customer_data),
                     "items": _ensure_item_images(order_doc.get("items", [])),
                     "statusHistory": [{"status": "created", "timestamp": now_time}, {"status": "paid", "timestamp": now_time, "by": "system:razorpay", "notes": "Payment verified"}],
                     "created_at": now_time,
+                    "createdAt": now_time,
                     "updated_at": now_time,
                     "notes": {"payment_method": "razorpay", "signature_verified": True}
                 }
@@ -564,9 +568,11 @@ def verify_razorpay_signature():
                 "amount": order_doc.get("amount", 0),
                 "currency": order_doc.get("currency", "INR"),
                 "customer": customer_data,
+                "customer_search": customer_search_terms(customer_data),
                 "items": order_doc.get("items", []),
                 "statusHistory": [{"status": "created", "timestamp": _now(db)}, {"status": "paid", "timestamp": _now(db), "by": "system:razorpay", "notes": "Payment verified"}],
                 "created_at": _now(db),
+                "createdAt": _now(db),
                 "updated_at": _now(db),
                 "notes": {
                     "payment_method": "razorpay",
@@ -709,6 +715,7 @@ def test_order_creation():
             "amount": 100,
             "currency": "INR",
             "created_at": _now(db),
+            "createdAt": _now(db),
             "updated_at": _now(db)
         }
         
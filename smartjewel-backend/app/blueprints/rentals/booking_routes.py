@@ -8,6 +8,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime, timedelta
 
+from app.utils.validation import positive_float
+
 bp_bookings = Blueprint("rental_bookings", __name__, url_prefix="/api/rentals")
 
 
@@ -17,10 +19,67 @@ def _db():
 
 def _validate_object_id(id_string, field_name="id"):
     """Validate and convert string to ObjectId"""
-    try:
-        return ObjectId(id_string)
-    except:
+    if not ObjectId.is_valid(id_string):
         return None
+    return ObjectId(id_string)
+
+
+def _ensure_indexes():
+    """Create indexes backing refund and payment lookups. Safe to call repeatedly."""
+    db = _db()
+    try:
+        db.rental_bookings.create_index(
+            [("booking_status", 1), ("deposit_refunded", 1)], name="idx_status_refunded"
+        )
+    except Exception:
+        pass
+    try:
+        db.rental_payments.create_index(
+            [("booking_id", 1), ("payment_type", 1)], name="idx_booking_payment_type"
+        )
+    except Exception:
+        pass
+
+
+_INDEXES_READY = False
+
+def _ensure_indexes_once():
+    global _INDEXES_READY
+    if _INDEXES_READY:
+        return
+    try:
+        _ensure_indexes()
+        _INDEXES_READY = True
+    except Exception:
+        # Ignore index failures for request path; subsequent requests can retry
+        pass
+
+
+# $lookup stages that project inside the join so only the fields the booking
+# views render are carried through the pipeline
+_PRODUCT_LOOKUP = {
+    "$lookup": {
+        "from": "items",
+        "let": {"pid": "$product_id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$pid"]}}},
+            {"$project": {"name": 1, "category": 1, "image": 1, "metal": 1, "purity": 1}}
+        ],
+        "as": "product"
+    }
+}
+
+_CUSTOMER_LOOKUP = {
+    "$lookup": {
+        "from": "users",
+        "let": {"cid": "$customer_id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$cid"]}}},
+            {"$project": {"full_name": 1, "email": 1, "phone_number": 1}}
+        ],
+        "as": "customer"
+    }
+}
 
 
 def _check_date_conflicts(db, rental_item_id, start_date, end_date, exclude_booking_id=None):
@@ -146,7 +205,8 @@ def create_booking():
     if start_date >= end_date:
         return jsonify({"error": "End date must be after start date"}), 400
     
-    if start_date < datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0):
+    now = datetime.utcnow()
+    if start_date < now.replace(hour=0, minute=0, second=0, microsecond=0):
         return jsonify({"error": "Start date cannot be in the past"}), 400
     
     # Calculate duration
@@ -164,7 +224,7 @@ def create_booking():
     
     # Check advance booking limit
     advance_days = rental_item.get("advance_booking_days", 90)
-    max_future_date = datetime.utcnow() + timedelta(days=advance_days)
+    max_future_date = now + timedelta(days=advance_days)
     if start_date > max_future_date:
         return jsonify({"error": f"Cannot book more than {advance_days} days in advance"}), 400
     
@@ -230,8 +290,8 @@ def create_booking():
         
         # Metadata
         "notes": data.get("notes", ""),
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
         "created_by": ObjectId(user_id),
         "cancelled_at": None,
         "cancelled_by": None,
@@ -289,16 +349,9 @@ def get_customer_bookings():
                 "as": "rental_item"
             }
         },
-        {"$unwind": {"path": "$rental_item", "preserveNullAndEmptyArrays": True}},
-        {
-            "$lookup": {
-                "from": "items",
-                "localField": "product_id",
-                "foreignField": "_id",
-                "as": "product"
-            }
-        },
-        {"$unwind": {"path": "$product", "preserveNullAndEmptyArrays": True}},
+        {"$addFields": {"rental_item": {"$arrayElemAt": ["$rental_item", 0]}}},
+        _PRODUCT_LOOKUP,
+        {"$addFields": {"product": {"$arrayElemAt": ["$product", 0]}}},
         {
             "$facet": {
                 "bookings": [
@@ -358,16 +411,9 @@ def get_booking_details(booking_id):
                 "as": "rental_item"
             }
         },
-        {"$unwind": {"path": "$rental_item", "preserveNullAndEmptyArrays": True}},
-        {
-            "$lookup": {
-                "from": "items",
-                "localField": "product_id",
-                "foreignField": "_id",
-                "as": "product"
-            }
-        },
-        {"$unwind": {"path": "$product", "preserveNullAndEmptyArrays": True}},
+        {"$addFields": {"rental_item": {"$arrayElemAt": ["$rental_item", 0]}}},
+        _PRODUCT_LOOKUP,
+        {"$addFields": {"product": {"$arrayElemAt": ["$product", 0]}}},
     ]
     
     result = list(db.rental_bookings.aggregate(pipeline))
@@ -433,15 +479,16 @@ def cancel_booking(booking_id):
         return jsonify({"error": "Can only cancel confirmed bookings that haven't been picked up"}), 400
     
     # Update booking
+    now = datetime.utcnow()
     db.rental_bookings.update_one(
         {"_id": booking_oid},
         {
             "$set": {
                 "booking_status": "cancelled",
-                "cancelled_at": datetime.utcnow(),
+                "cancelled_at": now,
                 "cancelled_by": ObjectId(user_id),
                 "cancellation_reason": data.get("reason", "Customer cancelled"),
-                "updated_at": datetime.utcnow()
+                "updated_at": now
             }
         }
     )
@@ -586,24 +633,10 @@ def admin_get_all_bookings():
     pipeline = [
         {"$match": match_query} if match_query else {"$match": {}},
         {"$sort": {"created_at": -1}},
-        {
-            "$lookup": {
-                "from": "items",
-                "localField": "product_id",
-                "foreignField": "_id",
-                "as": "product"
-            }
-        },
-        {"$unwind": {"path": "$product", "preserveNullAndEmptyArrays": True}},
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "customer_id",
-                "foreignField": "_id",
-                "as": "customer"
-            }
-        },
-        {"$unwind": {"path": "$customer", "preserveNullAndEmptyArrays": True}},
+        _PRODUCT_LOOKUP,
+        {"$addFields": {"product": {"$arrayElemAt": ["$product", 0]}}},
+        _CUSTOMER_LOOKUP,
+        {"$addFields": {"customer": {"$arrayElemAt": ["$customer", 0]}}},
     ]
     
     # Search filter
@@ -644,8 +677,6 @@ def admin_get_all_bookings():
             booking["product"]["_id"] = str(booking["product"]["_id"])
         if booking.get("customer"):
             booking["customer"]["_id"] = str(booking["customer"]["_id"])
-            # Remove sensitive data
-            booking["customer"].pop("password", None)
     
     return jsonify({
         "bookings": bookings,
@@ -695,16 +726,17 @@ def admin_mark_pickup(booking_id):
         return jsonify({"error": "Invalid condition. Must be excellent, good, or fair"}), 400
     
     # Update booking
+    now = datetime.utcnow()
     db.rental_bookings.update_one(
         {"_id": booking_oid},
         {
             "$set": {
                 "booking_status": "active",
-                "actual_pickup_date": datetime.utcnow(),
+                "actual_pickup_date": now,
                 "pickup_staff_id": ObjectId(user_id),
                 "condition_at_pickup": condition,
                 "notes": data.get("notes", booking.get("notes", "")),
-                "updated_at": datetime.utcnow()
+                "updated_at": now
             }
         }
     )
@@ -778,7 +810,7 @@ def admin_mark_return(booking_id):
         "late_fee": late_fee,
         "total_amount": booking["total_rental_price"] + booking["security_deposit"] + late_fee + damage_charge,
         "notes": data.get("notes", booking.get("notes", "")),
-        "updated_at": datetime.utcnow()
+        "updated_at": actual_return_date
     }
     
     db.rental_bookings.update_one(
@@ -809,6 +841,7 @@ def record_payment(booking_id):
         "notes": "string (optional)"
     }
     """
+    _ensure_indexes_once()
     db = _db()
     
     # Check admin access
@@ -841,12 +874,12 @@ def record_payment(booking_id):
     if payment_method not in ["cash", "card", "upi", "bank_transfer", "razorpay"]:
         return jsonify({"error": "Invalid payment_method"}), 400
     
-    try:
-        amount = float(amount)
-        if amount <= 0:
-            return jsonify({"error": "Amount must be positive"}), 400
-    except ValueError:
-        return jsonify({"error": "Invalid amount"}), 400
+    amount, error = positive_float(amount, "Amount")
+    if error:
+        return jsonify({"error": error}), 400
+    
+    # Single timestamp so the payment and booking update agree
+    now = datetime.utcnow()
     
     # Create payment record
     payment = {
@@ -855,11 +888,11 @@ def record_payment(booking_id):
         "payment_type": payment_type,
         "amount": amount,
         "payment_method": payment_method,
-        "payment_date": datetime.utcnow(),
+        "payment_date": now,
         "transaction_ref": data.get("transaction_ref", ""),
         "received_by": ObjectId(user_id),
         "notes": data.get("notes", ""),
-        "created_at": datetime.utcnow()
+        "created_at": now
     }
     
     db.rental_payments.insert_one(payment)
@@ -881,7 +914,7 @@ def record_payment(booking_id):
             "$set": {
                 "amount_paid": new_amount_paid,
                 "payment_status": payment_status,
-                "updated_at": datetime.utcnow()
+                "updated_at": now
             }
         }
     )
@@ -943,6 +976,7 @@ def process_refund(booking_id):
         "notes": "string (optional)"
     }
     """
+    _ensure_indexes_once()
     db = _db()
     
     # Check admin access
@@ -975,12 +1009,12 @@ def process_refund(booking_id):
     if not all([refund_amount, refund_method]):
         return jsonify({"error": "refund_amount and refund_method are required"}), 400
     
-    try:
-        refund_amount = float(refund_amount)
-        if refund_amount <= 0:
-            return jsonify({"error": "Refund amount must be positive"}), 400
-    except ValueError:
-        return jsonify({"error": "Invalid refund amount"}), 400
+    refund_amount, error = positive_float(refund_amount, "Refund amount")
+    if error:
+        return jsonify({"error": error}), 400
+    
+    # Single timestamp so the refund payment and booking update agree
+    now = datetime.utcnow()
     
     # Record refund as negative payment
     payment = {
@@ -989,11 +1023,11 @@ def process_refund(booking_id):
         "payment_type": "deposit_refund",
         "amount": -refund_amount,  # Negative for refund
         "payment_method": refund_method,
-        "payment_date": datetime.utcnow(),
+        "payment_date": now,
         "transaction_ref": data.get("transaction_ref", ""),
         "received_by": ObjectId(user_id),
         "notes": data.get("notes", "Deposit refund"),
-        "created_at": datetime.utcnow()
+        "created_at": now
     }
     
     db.rental_payments.insert_one(payment)
@@ -1004,7 +1038,7 @@ def process_refund(booking_id):
         {
             "$set": {
                 "deposit_refunded": True,
-                "updated_at": datetime.utcnow()
+                "updated_at": now
             }
         }
     )
@@ -1,6 +1,17 @@
+import re
+import time
+from datetime import datetime
+from functools import wraps
+
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.ttl_cache import MISSING
+from app.utils.user_cache import USER_ROLE_NAMES
+from app.utils.validation import positive_float
 
 bp = Blueprint("rentals", __name__, url_prefix="/api/rentals")
 
@@ -9,6 +20,78 @@ def _db():
     return current_app.extensions['mongo_db']
 
 
+def _ensure_indexes():
+    """Create indexes for rental item queries. Safe to call repeatedly.
+
+    Returns False when uniq_product_id could not be built.
+    """
+    db = _db()
+    unique_ready = True
+    try:
+        # One rental item per product; also backs the admin_create_rental check
+        db.rental_items.create_index([("product_id", 1)], name="uniq_product_id", unique=True)
+    except Exception:
+        # Duplicate rental items or a conflicting product_id index;
+        # scripts/ensure_unique_indexes.py reports both. admin_create_rental
+        # still checks for an existing item first, but concurrent creates can race
+        current_app.logger.exception("uniq_product_id index missing on rental_items")
+        unique_ready = False
+    try:
+        db.rental_items.create_index([("status", 1), ("product.category_lc", 1)], name="status_category_lc")
+    except Exception:
+        pass
+    return unique_ready
+
+
+_INDEXES_READY = False
+# A failed unique build (e.g. duplicate data) is retried at most this often
+_INDEX_RETRY_SECONDS = 300
+_indexes_retry_at = 0.0
+
+def _ensure_indexes_once():
+    """Ensure indexes; True once uniq_product_id exists."""
+    global _INDEXES_READY, _indexes_retry_at
+    if _INDEXES_READY:
+        return True
+    now = time.monotonic()
+    if now < _indexes_retry_at:
+        return False
+    _indexes_retry_at = now + _INDEX_RETRY_SECONDS
+    try:
+        _INDEXES_READY = _ensure_indexes()
+    except Exception:
+        # Ignore index failures for request path; a later request retries
+        pass
+    return _INDEXES_READY
+
+
+# Product display fields mirrored onto rental_items so list endpoints can be
+# served from a single collection without a $lookup into items.
+PRODUCT_SNAPSHOT_FIELDS = ("name", "category", "image", "metal", "purity", "isRentable", "status")
+
+
+def build_product_snapshot(product):
+    """Build the denormalized `product` subdocument stored on a rental item."""
+    snapshot = {field: product.get(field) for field in PRODUCT_SNAPSHOT_FIELDS}
+    # Lowercased copy lets the category filter use an anchored, indexable match
+    snapshot["category_lc"] = (product.get("category") or "").lower()
+    return snapshot
+
+
+def sync_rental_product(db, product_id):
+    """Refresh the product snapshot on rental items after the product changes.
+
+    Safe to call for products that have no rental item; it is a no-op then.
+    """
+    product = db.items.find_one({"_id": product_id}, {field: 1 for field in PRODUCT_SNAPSHOT_FIELDS})
+    if not product:
+        return
+    db.rental_items.update_many(
+        {"product_id": product_id},
+        {"$set": {"product": build_product_snapshot(product)}}
+    )
+
+
 @bp.get('')
 def get_rentals():
     """Get all available rental jewellery.
@@ -20,6 +103,7 @@ def get_rentals():
     - min_price: Minimum rental price per day
     - max_price: Maximum rental price per day
     """
+    _ensure_indexes_once()
     db = _db()
     
     # Parse pagination params
@@ -27,10 +111,15 @@ def get_rentals():
     per_page = min(60, max(1, int(request.args.get('per_page', 20))))
     skip = (page - 1) * per_page
     
-    # Build aggregation pipeline
+    # Build aggregation pipeline; product fields are denormalized on the
+    # rental item, so rentable/active filtering needs no $lookup
     pipeline = [
-        # Match only available rental items
-        {"$match": {"status": "available"}},
+        # Match only available rental items whose product is rentable and active
+        {"$match": {
+            "status": "available",
+            "product.isRentable": True,
+            "product.status": "active",
+        }},
     ]
     
     # Apply filters
@@ -47,24 +136,9 @@ def get_rentals():
     if price_match:
         pipeline.append({"$match": {"rental_price_per_day": price_match}})
     
-    # Lookup product details from items collection
-    pipeline.extend([
-        {
-            "$lookup": {
-                "from": "items",
-                "localField": "product_id",
-                "foreignField": "_id",
-                "as": "product"
-            }
-        },
-        {"$unwind": "$product"},
-        # Filter products that are rentable and active
-        {"$match": {"product.isRentable": True, "product.status": "active"}},
-    ])
-    
     # Apply category filter if provided
     if category:
-        pipeline.append({"$match": {"product.category": {"$regex": category, "$options": "i"}}})
+        pipeline.append({"$match": {"product.category_lc": {"$regex": "^" + re.escape(category.strip().lower())}}})
     
     # Add facet for pagination
     pipeline.append({
@@ -91,7 +165,8 @@ def get_rentals():
         }
     })
     
-    result = list(db.rental_items.aggregate(pipeline))
+    # $facet yields a single document; read it straight off the cursor
+    result = next(db.rental_items.aggregate(pipeline), None)
     
     if not result:
         return jsonify({
@@ -104,13 +179,8 @@ def get_rentals():
             }
         })
     
-    results = result[0]["results"]
-    total = result[0]["total"][0]["count"] if result[0]["total"] else 0
-    
-    # Convert ObjectIds to strings
-    for item in results:
-        item["_id"] = str(item["_id"])
-        item["product_id"] = str(item["product_id"])
+    results = result["results"]
+    total = result["total"][0]["count"] if result["total"] else 0
     
     return jsonify({
         "results": results,
@@ -132,10 +202,9 @@ def get_rental_detail(rental_item_id):
     """
     db = _db()
     
-    try:
-        rental_id = ObjectId(rental_item_id)
-    except Exception:
+    if not ObjectId.is_valid(rental_item_id):
         return jsonify({"error": "Invalid rental item ID"}), 400
+    rental_id = ObjectId(rental_item_id)
     
     # Aggregate to get rental item with product details
     pipeline = [
@@ -143,12 +212,29 @@ def get_rental_detail(rental_item_id):
         {
             "$lookup": {
                 "from": "items",
-                "localField": "product_id",
-                "foreignField": "_id",
+                "let": {"pid": "$product_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$pid"]}}},
+                    # Only the fields the detail page renders
+                    {
+                        "$project": {
+                            "name": 1,
+                            "category": 1,
+                            "image": 1,
+                            "metal": 1,
+                            "purity": 1,
+                            "weight": 1,
+                            "weight_unit": 1,
+                            "description": 1,
+                        }
+                    }
+                ],
                 "as": "product"
             }
         },
-        {"$unwind": "$product"},
+        # Flatten the 1:1 join in place; drop rental items whose product is gone
+        {"$addFields": {"product": {"$arrayElemAt": ["$product", 0]}}},
+        {"$match": {"product": {"$exists": True}}},
         {
             "$project": {
                 "_id": 1,
@@ -161,27 +247,12 @@ def get_rental_detail(rental_item_id):
         }
     ]
     
-    result = list(db.rental_items.aggregate(pipeline))
+    rental_item = next(db.rental_items.aggregate(pipeline), None)
     
-    if not result:
+    if not rental_item:
         return jsonify({"error": "Rental item not found"}), 404
     
-    rental_item = result[0]
-    
-    # Convert ObjectIds to strings
-    rental_item["_id"] = str(rental_item["_id"])
-    rental_item["product_id"] = str(rental_item["product_id"])
-    
-    # Convert product._id to string
-    if "product" in rental_item and "_id" in rental_item["product"]:
-        rental_item["product"]["_id"] = str(rental_item["product"]["_id"])
-    
-    # Also convert any nested ObjectIds in product
-    if "product" in rental_item:
-        for key, value in rental_item["product"].items():
-            if isinstance(value, ObjectId):
-                rental_item["product"][key] = str(value)
-    
+    # ObjectIds are serialized by the app's JSON provider
     return jsonify(rental_item)
 
 
@@ -189,6 +260,25 @@ def get_rental_detail(rental_item_id):
 # ADMIN ENDPOINTS - Rental Management
 # ============================================================================
 
+def _get_role_name(db, user_id):
+    """Return the user's role name, or None if the user does not exist.
+
+    Cached briefly in USER_ROLE_NAMES so bursts of admin requests don't
+    re-read the same user document; update_staff evicts it on a role change.
+    """
+    role_name = USER_ROLE_NAMES.get(user_id)
+    if role_name is not MISSING:
+        return role_name
+    
+    user = db.users.find_one({"_id": ObjectId(user_id)}, {"role.role_name": 1})
+    if not user:
+        return None
+    
+    role_name = user.get("role", {}).get("role_name", "")
+    USER_ROLE_NAMES.set(user_id, role_name)
+    return role_name
+
+
 def _check_admin_access():
     """Check if current user has admin access."""
     try:
@@ -196,14 +286,11 @@ def _check_admin_access():
         if not user_id:
             return False, jsonify({"error": "Authentication required"}), 401
         
-        db = _db()
-        user = db.users.find_one({"_id": ObjectId(user_id)})
-        
-        if not user:
+        role_name = _get_role_name(_db(), user_id)
+        if role_name is None:
             return False, jsonify({"error": "User not found"}), 404
         
         # Check if user has admin or staff level 3 role
-        role_name = user.get("role", {}).get("role_name", "")
         if role_name not in ["Admin", "Staff_L3"]:
             return False, jsonify({"error": "Insufficient permissions"}), 403
         
@@ -212,8 +299,20 @@ def _check_admin_access():
         return False, jsonify({"error": str(e)}), 500
 
 
+def admin_required(fn):
+    """Run JWT verification and the admin role check before entering the view."""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        has_access, error_response, status_code = _check_admin_access()
+        if not has_access:
+            return error_response, status_code
+        return fn(*args, **kwargs)
+    return wrapper
+
+
 @bp.get('/admin/all')
-@jwt_required()
+@admin_required
 def admin_get_all_rentals():
     """Get all rental items (admin only).
     
@@ -223,11 +322,6 @@ def admin_get_all_rentals():
     - status: Filter by status (available/rented/maintenance)
     - search: Search by product name
     """
-    # Check admin access
-    has_access, error_response, status_code = _check_admin_access()
-    if not has_access:
-        return error_response, status_code
-    
     db = _db()
     
     # Parse pagination params
@@ -243,25 +337,12 @@ def admin_get_all_rentals():
     if status_filter:
         pipeline.append({"$match": {"status": status_filter}})
     
-    # Lookup product details
-    pipeline.extend([
-        {
-            "$lookup": {
-                "from": "items",
-                "localField": "product_id",
-                "foreignField": "_id",
-                "as": "product"
-            }
-        },
-        {"$unwind": "$product"},
-    ])
-    
     # Search by product name if provided
     search_query = request.args.get('search')
     if search_query:
         pipeline.append({
             "$match": {
-                "product.name": {"$regex": search_query, "$options": "i"}
+                "product.name": {"$regex": re.escape(search_query), "$options": "i"}
             }
         })
     
@@ -292,7 +373,8 @@ def admin_get_all_rentals():
         }
     })
     
-    result = list(db.rental_items.aggregate(pipeline))
+    # $facet yields a single document; read it straight off the cursor
+    result = next(db.rental_items.aggregate(pipeline), None)
     
     if not result:
         return jsonify({
@@ -305,13 +387,8 @@ def admin_get_all_rentals():
             }
         })
     
-    results = result[0]["results"]
-    total = result[0]["total"][0]["count"] if result[0]["total"] else 0
-    
-    # Convert ObjectIds to strings
-    for item in results:
-        item["_id"] = str(item["_id"])
-        item["product_id"] = str(item["product_id"])
+    results = result["results"]
+    total = result["total"][0]["count"] if result["total"] else 0
     
     return jsonify({
         "results": results,
@@ -325,7 +402,7 @@ def admin_get_all_rentals():
 
 
 @bp.post('/admin')
-@jwt_required()
+@admin_required
 def admin_create_rental():
     """Create a new rental item (admin only).
     
@@ -334,11 +411,7 @@ def admin_create_rental():
     - rental_price_per_day: Rental price per day
     - security_deposit: Security deposit amount
     """
-    # Check admin access
-    has_access, error_response, status_code = _check_admin_access()
-    if not has_access:
-        return error_response, status_code
-    
+    _ensure_indexes_once()
     db = _db()
     data = request.get_json() or {}
     
@@ -351,57 +424,75 @@ def admin_create_rental():
         return jsonify({"error": "Missing required fields"}), 400
     
     # Validate pricing
-    try:
-        rental_price = float(rental_price)
-        security_deposit = float(security_deposit)
-        
-        if rental_price <= 0 or security_deposit <= 0:
-            return jsonify({"error": "Prices must be greater than 0"}), 400
-    except ValueError:
-        return jsonify({"error": "Invalid price format"}), 400
+    rental_price, error = positive_float(rental_price, "Rental price")
+    if error:
+        return jsonify({"error": error}), 400
+    security_deposit, error = positive_float(security_deposit, "Security deposit")
+    if error:
+        return jsonify({"error": error}), 400
     
     # Validate product exists
-    try:
-        product_obj_id = ObjectId(product_id)
-    except Exception:
+    if not ObjectId.is_valid(product_id):
         return jsonify({"error": "Invalid product ID"}), 400
+    product_obj_id = ObjectId(product_id)
     
-    product = db.items.find_one({"_id": product_obj_id})
+    # Fetch the product and any existing rental item for it in one round-trip
+    product = next(db.items.aggregate([
+        {"$match": {"_id": product_obj_id}},
+        {"$project": {field: 1 for field in PRODUCT_SNAPSHOT_FIELDS}},
+        {
+            "$lookup": {
+                "from": "rental_items",
+                "let": {"pid": "$_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$product_id", "$$pid"]}}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}}
+                ],
+                "as": "existing_rentals"
+            }
+        }
+    ]), None)
     if not product:
         return jsonify({"error": "Product not found"}), 404
     
     # Check if rental item already exists for this product
-    existing_rental = db.rental_items.find_one({"product_id": product_obj_id})
-    if existing_rental:
+    if product["existing_rentals"]:
         return jsonify({"error": "Rental item already exists for this product"}), 409
     
-    # Create rental item
-    from datetime import datetime
+    # Create rental item with a snapshot of the product (marked rentable below).
+    # The _id is generated client-side so the response never waits on a re-read.
+    already_rentable = product.get("isRentable") is True
+    product["isRentable"] = True
     rental_item = {
+        "_id": ObjectId(),
         "product_id": product_obj_id,
         "rental_price_per_day": rental_price,
         "security_deposit": security_deposit,
         "status": "available",
+        "product": build_product_snapshot(product),
         "created_at": datetime.utcnow()
     }
     
-    result = db.rental_items.insert_one(rental_item)
+    try:
+        db.rental_items.insert_one(rental_item)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent create for the same product
+        return jsonify({"error": "Rental item already exists for this product"}), 409
     
-    # Update product to mark as rentable
-    db.items.update_one(
-        {"_id": product_obj_id},
-        {"$set": {"isRentable": True}}
-    )
+    # Update product to mark as rentable; skip the round-trip if it already is
+    if not already_rentable:
+        db.items.update_one(
+            {"_id": product_obj_id},
+            {"$set": {"isRentable": True}}
+        )
     
     # Return created rental item
-    rental_item["_id"] = str(result.inserted_id)
-    rental_item["product_id"] = str(rental_item["product_id"])
-    
     return jsonify(rental_item), 201
 
 
 @bp.put('/admin/<rental_item_id>')
-@jwt_required()
+@admin_required
 def admin_update_rental(rental_item_id):
     """Update a rental item (admin only).
     
@@ -410,45 +501,28 @@ def admin_update_rental(rental_item_id):
     - security_deposit: (optional) New security deposit
     - status: (optional) New status (available/rented/maintenance)
     """
-    # Check admin access
-    has_access, error_response, status_code = _check_admin_access()
-    if not has_access:
-        return error_response, status_code
-    
     db = _db()
     data = request.get_json() or {}
     
     # Validate rental item ID
-    try:
-        rental_id = ObjectId(rental_item_id)
-    except Exception:
+    if not ObjectId.is_valid(rental_item_id):
         return jsonify({"error": "Invalid rental item ID"}), 400
-    
-    # Check if rental item exists
-    rental_item = db.rental_items.find_one({"_id": rental_id})
-    if not rental_item:
-        return jsonify({"error": "Rental item not found"}), 404
+    rental_id = ObjectId(rental_item_id)
     
     # Build update document
     update_data = {}
     
     if "rental_price_per_day" in data:
-        try:
-            price = float(data["rental_price_per_day"])
-            if price <= 0:
-                return jsonify({"error": "Rental price must be greater than 0"}), 400
-            update_data["rental_price_per_day"] = price
-        except ValueError:
-            return jsonify({"error": "Invalid rental price format"}), 400
+        price, error = positive_float(data["rental_price_per_day"], "Rental price")
+        if error:
+            return jsonify({"error": error}), 400
+        update_data["rental_price_per_day"] = price
     
     if "security_deposit" in data:
-        try:
-            deposit = float(data["security_deposit"])
-            if deposit <= 0:
-                return jsonify({"error": "Security deposit must be greater than 0"}), 400
-            update_data["security_deposit"] = deposit
-        except ValueError:
-            return jsonify({"error": "Invalid security deposit format"}), 400
+        deposit, error = positive_float(data["security_deposit"], "Security deposit")
+        if error:
+            return jsonify({"error": error}), 400
+        update_data["security_deposit"] = deposit
     
     if "status" in data:
         status = data["status"]
@@ -459,52 +533,40 @@ def admin_update_rental(rental_item_id):
     if not update_data:
         return jsonify({"error": "No valid fields to update"}), 400
     
-    # Update rental item
-    from datetime import datetime
     update_data["updated_at"] = datetime.utcnow()
     
-    db.rental_items.update_one(
+    # Update rental item and return the fresh document in one round-trip
+    updated_rental = db.rental_items.find_one_and_update(
         {"_id": rental_id},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
     )
-    
-    # Get updated rental item
-    updated_rental = db.rental_items.find_one({"_id": rental_id})
-    updated_rental["_id"] = str(updated_rental["_id"])
-    updated_rental["product_id"] = str(updated_rental["product_id"])
+    if not updated_rental:
+        return jsonify({"error": "Rental item not found"}), 404
     
     return jsonify(updated_rental)
 
 
 @bp.delete('/admin/<rental_item_id>')
-@jwt_required()
+@admin_required
 def admin_delete_rental(rental_item_id):
     """Delete a rental item (admin only).
     
     Query params:
     - unmark_rentable: If true, also set product.isRentable to false (default: false)
     """
-    # Check admin access
-    has_access, error_response, status_code = _check_admin_access()
-    if not has_access:
-        return error_response, status_code
-    
     db = _db()
     
     # Validate rental item ID
-    try:
-        rental_id = ObjectId(rental_item_id)
-    except Exception:
+    if not ObjectId.is_valid(rental_item_id):
         return jsonify({"error": "Invalid rental item ID"}), 400
+    rental_id = ObjectId(rental_item_id)
     
-    # Check if rental item exists
-    rental_item = db.rental_items.find_one({"_id": rental_id})
+    # Delete rental item, keeping product_id for the unmark_rentable branch
+    rental_item = db.rental_items.find_one_and_delete({"_id": rental_id}, projection={"product_id": 1})
     if not rental_item:
         return jsonify({"error": "Rental item not found"}), 404
     
-    # Delete rental item
-    db.rental_items.delete_one({"_id": rental_id})
-    
     # Optionally unmark product as rentable
     unmark_rentable = request.args.get('unmark_rentable', 'false').lower() == 'true'
     if unmark_rentable:
@@ -1,26 +1,39 @@
-from flask import Blueprint, request, jsonify, current_app
+import hashlib
+import re
+import time
+
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
 from app.utils.authz import require_permissions
+from app.utils.json_stream import dumps, stream_list
+from app.utils.shift_schedules import SCHEDULE_KEY_FIELDS, schedule_dedupe_key
+from app.utils.ttl_cache import MISSING, TTLCache
+from app.utils.user_cache import USER_ROLE_NAMES, USER_STORE_OIDS
 from bson import ObjectId
-from marshmallow import Schema, fields, ValidationError
-from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from marshmallow import Schema, fields, validate, ValidationError, post_load
+from datetime import date, datetime
+from functools import lru_cache
 
 bp = Blueprint("staff", __name__, url_prefix="/api")
 
+_STATUS_CHOICES = ("active", "inactive")
+
 # ---- Schemas ----
 class StaffSchema(Schema):
     full_name = fields.String(required=True)
     email = fields.Email(required=True)
     phone_number = fields.String(required=False, allow_none=True)
     role_id = fields.String(required=True)
-    status = fields.String(validate=lambda v: v in ["active", "inactive"], required=False)
+    status = fields.String(validate=validate.OneOf(_STATUS_CHOICES), required=False)
     store_id = fields.String(required=False, allow_none=True)
 
 class StaffUpdateSchema(Schema):
     full_name = fields.String(required=False)
     phone_number = fields.String(required=False)
     role_id = fields.String(required=False)
-    status = fields.String(validate=lambda v: v in ["active", "inactive"], required=False)
+    status = fields.String(validate=validate.OneOf(_STATUS_CHOICES), required=False)
     store_id = fields.String(required=False, allow_none=True)
 
 class RoleSchema(Schema):
@@ -42,14 +55,40 @@ class ShiftScheduleSchema(Schema):
     notes = fields.String(required=False, allow_none=True)
     exceptions = fields.List(fields.Dict(), required=False)  # [{date: YYYY-MM-DD, start_time,end_time,notes}]
 
+    @post_load
+    def _to_storage(self, data, **kwargs):
+        # MongoDB stores datetimes, not dates
+        for key in ("effective_from", "effective_to"):
+            if isinstance(data.get(key), date):
+                data[key] = datetime.combine(data[key], datetime.min.time())
+        if data.get("days"):
+            data["days"] = sorted(data["days"])
+        return data
+
 class ShiftLogSchema(Schema):
-    staff_id = fields.String(required=True)
+    staff_id = fields.String(required=True, validate=ObjectId.is_valid)
     clock_in = fields.DateTime(required=True)
     clock_out = fields.DateTime(required=False, allow_none=True)
     source = fields.String(required=False, allow_none=True)
     store_id = fields.String(required=False, allow_none=True)
     notes = fields.String(required=False, allow_none=True)
 
+    @post_load
+    def _to_storage(self, data, **kwargs):
+        # Canonical lowercase hex, as list_shift_logs filters on str(ObjectId)
+        data["staff_id"] = str(ObjectId(data["staff_id"]))
+        return data
+
+# Schema instances are reused across requests; building them per call repeats
+# Marshmallow's field introspection
+_STAFF_SCHEMA = StaffSchema()
+_STAFF_UPDATE_SCHEMA = StaffUpdateSchema()
+_ROLE_SCHEMA = RoleSchema()
+_ROLE_PERMS_SCHEMA = RolePermsSchema()
+_SHIFT_SCHEDULE_SCHEMA = ShiftScheduleSchema()
+_SHIFT_SCHEDULE_PARTIAL_SCHEMA = ShiftScheduleSchema(partial=True)
+_SHIFT_LOG_SCHEMA = ShiftLogSchema()
+
 # Supported permissions (can be expanded)
 SUPPORTED_PERMISSIONS = [
     # Manager (L1)
@@ -62,40 +101,177 @@ SUPPORTED_PERMISSIONS = [
     "staff.manage",
 ]
 
+# SUPPORTED_PERMISSIONS is static, so its response is serialized once.
+# private: the endpoint is behind a JWT, so shared caches must not keep it
+_PERMISSIONS_BODY = dumps({"items": SUPPORTED_PERMISSIONS})
+_PERMISSIONS_ETAG = hashlib.md5(_PERMISSIONS_BODY).hexdigest()
+_PERMISSIONS_HEADERS = {"Cache-Control": "private, max-age=3600", "ETag": f'"{_PERMISSIONS_ETAG}"'}
+
+# Fields read when serializing a staff member in list_staff
+_STAFF_LIST_PROJECTION = {
+    "full_name": 1, "name": 1, "email": 1, "phone_number": 1,
+    "status": 1, "is_active": 1, "role": 1, "store_id": 1,
+}
+
 # ---- Helpers ----
+@lru_cache(maxsize=4096)
 def _oid(id_str: str):
+    # ObjectId is immutable, so parsed ids can be shared between requests
     try:
         return ObjectId(id_str)
     except Exception:
         return None
 
-def _now(db):
+def _now():
+    # Local UTC clock; avoids an isMaster round-trip on every write
+    return datetime.utcnow()
+
+# Short-lived role_id -> role cache; roles rarely change but staff
+# create/update look one up on every request
+_role_cache = TTLCache(maxsize=128, ttl=60)
+
+def _get_role(db, role_id):
+    """Return ``{"_id", "role_name"}`` for role_id, or None if it does not exist."""
+    role = _role_cache.get(role_id)
+    if role is not MISSING:
+        return role
+
+    role = db.roles.find_one({"_id": _oid(role_id)}, {"role_name": 1})
+    if not role:
+        return None
+    _role_cache.set(role_id, role)
+    return role
+
+def _parse_iso(value):
+    """Parse an ISO 8601 query arg; None when it is malformed."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+def _parse_range_args():
+    """Parse ?from= / ?to= once. Returns (from, to, error_details)."""
+    parsed = {}
+    for arg in ("from", "to"):
+        raw = request.args.get(arg)
+        parsed[arg] = _parse_iso(raw) if raw else None
+        if raw and parsed[arg] is None:
+            return None, None, {arg: ["invalid ISO 8601 datetime"]}
+    return parsed["from"], parsed["to"], None
+
+def _ensure_indexes():
+    """Create indexes for staff queries. Safe to call repeatedly.
+
+    Returns False when uniq_email could not be built.
+    """
+    db = current_app.extensions['mongo_db']
+    unique_ready = True
+    try:
+        # Same spec as scripts/ensure_indexes.py; create_staff relies on it for email_in_use
+        db.users.create_index([("email", 1)], name="uniq_email", unique=True)
+    except Exception:
+        # Duplicate emails or a conflicting email index;
+        # scripts/ensure_unique_indexes.py reports both
+        current_app.logger.exception("uniq_email index missing; create_staff falls back to an email pre-check")
+        unique_ready = False
+    try:
+        db.users.create_index([("full_name_lower", 1)], name="full_name_lower")
+    except Exception:
+        pass
+    try:
+        db.users.create_index([("phone_number", 1)], name="phone_number")
+    except Exception:
+        pass
+    # Equality fields first, then the sort key, so list_staff can walk the
+    # index in order (and seek to a keyset cursor) instead of sorting in memory
+    try:
+        db.users.create_index(
+            [("status", 1), ("role._id", 1), ("_id", -1)],
+            name="status_role_id_desc",
+        )
+    except Exception:
+        pass
+    try:
+        db.shift_logs.create_index(
+            [("staff_id", 1), ("store_id", 1), ("clock_in", -1)],
+            name="staff_store_clock_in_desc",
+        )
+    except Exception:
+        pass
+    try:
+        # Per-staff history without a store filter, and bulk log ingestion
+        db.shift_logs.create_index([("staff_id", 1), ("clock_in", -1)], name="staff_clock_in_desc")
+    except Exception:
+        pass
+    try:
+        db.shift_schedules.create_index(
+            [("store_id", 1), ("effective_from", 1), ("effective_to", 1)],
+            name="store_effective_range",
+        )
+    except Exception:
+        pass
     try:
-        is_master = db.command("isMaster")
-        return is_master.get("localTime")
+        # Partial so schedules created before dedupe_key existed don't collide
+        db.shift_schedules.create_index(
+            [("dedupe_key", 1)],
+            name="uniq_dedupe_key",
+            unique=True,
+            partialFilterExpression={"dedupe_key": {"$type": "string"}},
+        )
     except Exception:
-        return datetime.utcnow()
+        pass
+    return unique_ready
+
+
+_INDEXES_READY = False
+# A failed unique build (e.g. duplicate data) is retried at most this often
+_INDEX_RETRY_SECONDS = 300
+_indexes_retry_at = 0.0
+
+def _ensure_indexes_once():
+    """Ensure indexes; True once uniq_email exists."""
+    global _INDEXES_READY, _indexes_retry_at
+    if _INDEXES_READY:
+        return True
+    now = time.monotonic()
+    if now < _indexes_retry_at:
+        return False
+    _indexes_retry_at = now + _INDEX_RETRY_SECONDS
+    try:
+        _INDEXES_READY = _ensure_indexes()
+    except Exception:
+        # Ignore index failures for request path; a later request retries
+        pass
+    return _INDEXES_READY
 
 # ---- Staff CRUD ----
 @bp.get("/staff")
 @jwt_required()
 @require_permissions("shift.view")
 def list_staff():
+    _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
     q = (request.args.get("query") or "").strip().lower()
     status = request.args.get("status")
     role_id = request.args.get("role_id")
     page = int(request.args.get("page") or 1)
     limit = min(int(request.args.get("limit") or 20), 100)
+    # Keyset cursor: the id of the last staff member on the previous page
+    after = request.args.get("after")
+    after_oid = _oid(after) if after else None
+    if after and after_oid is None:
+        return jsonify({"error": "invalid_cursor"}), 400
 
     # Build filters with proper AND semantics
     and_terms = []
     if q:
+        # Anchored, case-sensitive prefixes on lowercased fields can use an index
+        prefix = f"^{re.escape(q)}"
         and_terms.append({
             "$or": [
-                {"full_name": {"$regex": q, "$options": "i"}},
-                {"email": {"$regex": q, "$options": "i"}},
-                {"phone_number": {"$regex": q, "$options": "i"}},
+                {"full_name_lower": {"$regex": prefix}},
+                {"email": {"$regex": prefix}},
+                {"phone_number": {"$regex": prefix}},
             ]
         })
     if status:
@@ -119,11 +295,35 @@ def list_staff():
     # Final filter
     filt = {"$and": and_terms} if and_terms else {"role.role_name": {"$nin": ["Customer", "Admin"]}}
 
-    # Newest first: prefer created_at desc, fallback by _id desc
-    sort_spec = [("created_at", -1), ("_id", -1)]
-    cursor = db.users.find(filt).sort(sort_spec).skip((page-1)*limit).limit(limit)
+    # Newest first by _id (its timestamp is the insert time), so the last id
+    # on a page is a stable cursor for the next one
+    if after_oid:
+        # Keyset page: seek past the cursor on the index instead of skipping
+        # rows, and skip the full count
+        filt = {"$and": [filt, {"_id": {"$lt": after_oid}}]}
+        docs = list(db.users.find(filt, _STAFF_LIST_PROJECTION).sort("_id", -1).limit(limit))
+        total = None
+    else:
+        # Page and total in one round-trip so the filter is evaluated once.
+        # The $sort stays ahead of $facet: stages inside a facet can't use an
+        # index, so sorting there would sort every match in memory per page
+        pipeline = [
+            {"$match": filt},
+            {"$sort": {"_id": -1}},
+            {"$facet": {
+                "items": [
+                    {"$skip": (page-1)*limit},
+                    {"$limit": limit},
+                    {"$project": _STAFF_LIST_PROJECTION},
+                ],
+                "total": [{"$count": "n"}],
+            }},
+        ]
+        result = next(db.users.aggregate(pipeline), None) or {"items": [], "total": []}
+        docs = result["items"]
+        total = result["total"][0]["n"] if result["total"] else 0
     items = []
-    for u in cursor:
+    for u in docs:
         items.append({
             "id": str(u["_id"]),
             "full_name": u.get("full_name") or u.get("name"),
@@ -133,39 +333,48 @@ def list_staff():
             "role": {"_id": str(u["role"]["_id"]) , "role_name": u["role"]["role_name"]} if u.get("role") else None,
             "store_id": (str(u.get("store_id")) if isinstance(u.get("store_id"), ObjectId) else u.get("store_id")),
         })
-    total = db.users.count_documents(filt)
-    return jsonify({"items": items, "page": page, "limit": limit, "total": total})
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    if after_oid:
+        return jsonify({"items": items, "limit": limit, "next_cursor": next_cursor})
+    return jsonify({"items": items, "page": page, "limit": limit, "total": total, "next_cursor": next_cursor})
 
 @bp.post("/staff")
 @jwt_required()
 @require_permissions("staff.manage")
 def create_staff():
+    unique_email = _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
     try:
-        payload = StaffSchema().load(request.get_json() or {})
+        payload = _STAFF_SCHEMA.load(request.get_json() or {})
     except ValidationError as err:
         return jsonify({"error": "validation_failed", "details": err.messages}), 400
 
     email_l = payload["email"].lower()
-    if db.users.find_one({"email": email_l}):
+    if not unique_email and db.users.find_one({"email": email_l}, {"_id": 1}):
         return jsonify({"error": "email_in_use"}), 409
 
-    role = db.roles.find_one({"_id": _oid(payload["role_id"])})
+    role = _get_role(db, payload["role_id"])
     if not role:
         return jsonify({"error": "role_not_found"}), 404
 
     user_doc = {
         "full_name": payload["full_name"],
+        "full_name_lower": payload["full_name"].lower(),
         "email": email_l,
         "phone_number": payload.get("phone_number"),
         "role": {"_id": str(role["_id"]), "role_name": role["role_name"]},
         "status": payload.get("status") or "active",
-        "created_at": _now(db),
+        "created_at": _now(),
     }
     # Optional store assignment at creation
-    if payload.get("store_id") and _oid(payload.get("store_id")):
-        user_doc["store_id"] = str(_oid(payload.get("store_id")))
-    ins = db.users.insert_one(user_doc)
+    store_oid = _oid(payload.get("store_id")) if payload.get("store_id") else None
+    if store_oid:
+        user_doc["store_id"] = str(store_oid)
+    try:
+        ins = db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # uniq_email enforces this server-side once it exists
+        return jsonify({"error": "email_in_use"}), 409
     return jsonify({"id": str(ins.inserted_id)}), 201
 
 @bp.get("/staff/<id>")
@@ -173,7 +382,10 @@ def create_staff():
 @require_permissions("shift.view")
 def get_staff(id):
     db = current_app.extensions['mongo_db']
-    u = db.users.find_one({"_id": _oid(id)})
+    oid = _oid(id)
+    if oid is None:
+        return jsonify({"error": "invalid_id"}), 400
+    u = db.users.find_one({"_id": oid})
     if not u:
         return jsonify({"error": "not_found"}), 404
     return jsonify({
@@ -192,38 +404,49 @@ def get_staff(id):
 @require_permissions("staff.manage")
 def update_staff(id):
     db = current_app.extensions['mongo_db']
+    oid = _oid(id)
+    if oid is None:
+        return jsonify({"error": "invalid_id"}), 400
 
     # Log what we received
     import json
     print(f"🔍 UPDATE STAFF PAYLOAD: {json.dumps(request.get_json())}")
 
     try:
-        payload = StaffUpdateSchema().load(request.get_json() or {})
+        payload = _STAFF_UPDATE_SCHEMA.load(request.get_json() or {})
     except ValidationError as err:
         print(f"❌ VALIDATION ERROR: {err.messages}")
         return jsonify({"error": "validation_failed", "details": err.messages}), 400
     update = {}
     if "full_name" in payload:
         update["full_name"] = payload["full_name"]
+        update["full_name_lower"] = payload["full_name"].lower()
     if "phone_number" in payload:
         update["phone_number"] = payload["phone_number"]
     if "status" in payload:
         update["status"] = payload["status"]
     if "role_id" in payload:
-        role = db.roles.find_one({"_id": _oid(payload["role_id"])})
+        role = _get_role(db, payload["role_id"])
         if not role:
             return jsonify({"error": "role_not_found"}), 404
         update["role"] = {"_id": str(role["_id"]), "role_name": role["role_name"]}
     if "store_id" in payload:
         # allow clearing by sending empty or null
         sid = payload.get("store_id")
-        if sid and _oid(sid):
-            update["store_id"] = str(_oid(sid))
+        store_oid = _oid(sid) if sid else None
+        if store_oid:
+            update["store_id"] = str(store_oid)
         else:
             update["store_id"] = None
-    res = db.users.update_one({"_id": _oid(id)}, {"$set": update})
+    res = db.users.update_one({"_id": oid}, {"$set": update})
     if res.matched_count == 0:
         return jsonify({"error": "not_found"}), 404
+    if "role" in update:
+        # Rental admin checks read the role through this cache
+        USER_ROLE_NAMES.pop(str(oid))
+    if "store_id" in update:
+        # Store manager routes scope every query by the cached store
+        USER_STORE_OIDS.pop(str(oid))
     return jsonify({"updated": True})
 
 @bp.patch("/staff/<id>/status")
@@ -231,37 +454,60 @@ def update_staff(id):
 @require_permissions("staff.manage")
 def patch_staff_status(id):
     db = current_app.extensions['mongo_db']
+    oid = _oid(id)
+    if oid is None:
+        return jsonify({"error": "invalid_id"}), 400
     body = request.get_json() or {}
     status = body.get("status")
-    if status not in ["active", "inactive"]:
+    if status not in _STATUS_CHOICES:
         return jsonify({"error": "validation_failed", "details": {"status": ["invalid"]}}), 400
-    res = db.users.update_one({"_id": _oid(id)}, {"$set": {"status": status}})
+    res = db.users.update_one({"_id": oid}, {"$set": {"status": status}})
     if res.matched_count == 0:
         return jsonify({"error": "not_found"}), 404
     return jsonify({"updated": True})
 
 # ---- Roles & Permissions ----
+DEFAULT_ROLES = {
+    "Admin": ["*"],
+    "Staff_L1": [
+        "discount.approve", "product.manage", "analytics.view.store", "shift.view"
+    ],
+    "Staff_L2": [
+        "billing.use_pos", "customer.view", "assist.ai", "tryon.use"
+    ],
+    "Staff_L3": [
+        "inventory.modify", "tag.assign", "inventory.flow.view"
+    ],
+    "Customer": ["profile.read", "orders.read"],
+}
+
+_ROLES_SEEDED = False
+
+def _seed_default_roles_once():
+    """Insert any missing default roles once per process; never overwrites."""
+    global _ROLES_SEEDED
+    if _ROLES_SEEDED:
+        return
+    db = current_app.extensions['mongo_db']
+    try:
+        db.roles.bulk_write([
+            UpdateOne(
+                {"role_name": rn},
+                {"$setOnInsert": {"role_name": rn, "permissions": perms}},
+                upsert=True,
+            )
+            for rn, perms in DEFAULT_ROLES.items()
+        ], ordered=False)
+        _ROLES_SEEDED = True
+    except Exception:
+        # Retry on a later request if the database is unavailable
+        pass
+
 @bp.get("/roles")
 @jwt_required()
 def list_roles():
+    _seed_default_roles_once()
     db = current_app.extensions['mongo_db']
-    # Auto-seed defaults if empty
-    if db.roles.count_documents({}) == 0:
-        defaults = {
-            "Admin": ["*"],
-            "Staff_L1": [
-                "discount.approve", "product.manage", "analytics.view.store", "shift.view"
-            ],
-            "Staff_L2": [
-                "billing.use_pos", "customer.view", "assist.ai", "tryon.use"
-            ],
-            "Staff_L3": [
-                "inventory.modify", "tag.assign", "inventory.flow.view"
-            ],
-            "Customer": ["profile.read", "orders.read"],
-        }
-        for rn, perms in defaults.items():
-            db.roles.update_one({"role_name": rn}, {"$set": {"role_name": rn, "permissions": perms}}, upsert=True)
     roles = []
     for r in db.roles.find({}):
         roles.append({"id": str(r["_id"]), "role_name": r.get("role_name"), "permissions": r.get("permissions", [])})
@@ -273,7 +519,7 @@ def list_roles():
 def create_role():
     db = current_app.extensions['mongo_db']
     try:
-        payload = RoleSchema().load(request.get_json() or {})
+        payload = _ROLE_SCHEMA.load(request.get_json() or {})
     except ValidationError as err:
         return jsonify({"error": "validation_failed", "details": err.messages}), 400
     if db.roles.find_one({"role_name": payload["role_name"]}):
@@ -286,11 +532,14 @@ def create_role():
 @require_permissions("staff.manage")
 def update_role_permissions(id):
     db = current_app.extensions['mongo_db']
+    oid = _oid(id)
+    if oid is None:
+        return jsonify({"error": "invalid_id"}), 400
     try:
-        payload = RolePermsSchema().load(request.get_json() or {})
+        payload = _ROLE_PERMS_SCHEMA.load(request.get_json() or {})
     except ValidationError as err:
         return jsonify({"error": "validation_failed", "details": err.messages}), 400
-    res = db.roles.update_one({"_id": _oid(id)}, {"$set": {"permissions": payload["permissions"]}})
+    res = db.roles.update_one({"_id": oid}, {"$set": {"permissions": payload["permissions"]}})
     if res.matched_count == 0:
         return jsonify({"error": "not_found"}), 404
     return jsonify({"updated": True})
@@ -299,7 +548,9 @@ def update_role_permissions(id):
 @jwt_required()
 @require_permissions("*")
 def list_permissions():
-    return jsonify({"items": SUPPORTED_PERMISSIONS})
+    if request.if_none_match.contains(_PERMISSIONS_ETAG):
+        return Response(status=304, headers=_PERMISSIONS_HEADERS)
+    return Response(_PERMISSIONS_BODY, mimetype="application/json", headers=_PERMISSIONS_HEADERS)
 
 # ---- Shift Schedules ----
 @bp.get("/staff/<id>/shift-schedules")
@@ -307,8 +558,11 @@ def list_permissions():
 @require_permissions("shift.view")
 def list_shift_schedules(id):
     db = current_app.extensions['mongo_db']
+    oid = _oid(id)
+    if oid is None:
+        return jsonify({"error": "invalid_id"}), 400
     schedules = []
-    for s in db.shift_schedules.find({"staff_id": str(_oid(id))}):
+    for s in db.shift_schedules.find({"staff_id": str(oid)}):
         s["id"] = str(s.pop("_id"))
         # Ensure all ObjectIds are converted to strings
         for key, value in s.items():
@@ -321,92 +575,71 @@ def list_shift_schedules(id):
 @jwt_required()
 @require_permissions("staff.manage")
 def create_shift_schedule(id):
+    _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
+    oid = _oid(id)
+    if oid is None:
+        return jsonify({"error": "invalid_id"}), 400
     try:
-        payload = ShiftScheduleSchema().load(request.get_json() or {})
+        payload = _SHIFT_SCHEDULE_SCHEMA.load(request.get_json() or {})
     except ValidationError as err:
         return jsonify({"error": "validation_failed", "details": err.messages}), 400
     # Validate one-time requires effective_from
     if payload.get("recurrence") == "one_time" and not payload.get("effective_from"):
         return jsonify({"error": "validation_failed", "details": {"effective_from": ["required for one_time"]}}), 400
 
-    doc = dict(payload)
-    doc["staff_id"] = str(_oid(id))
+    doc = payload
+    doc["staff_id"] = str(oid)
 
-    # Detect duplicates (same key fields)
-    match = {
-        "staff_id": doc["staff_id"],
-        "recurrence": doc["recurrence"],
-        "start_time": doc.get("start_time"),
-        "end_time": doc.get("end_time"),
-        "timezone": doc.get("timezone"),
-    }
-    if doc["recurrence"] == "weekly":
-        match["days"] = sorted(doc.get("days") or [])
-    else:
-        # For one-time compare on date window
-        # Convert datetime.date to datetime.datetime for MongoDB compatibility
-        from datetime import datetime, date
-        if doc.get("effective_from"):
-            effective_from_date = doc.get("effective_from")
-            if isinstance(effective_from_date, date):
-                match["effective_from"] = datetime.combine(effective_from_date, datetime.min.time())
-            else:
-                match["effective_from"] = effective_from_date
-        if doc.get("effective_to"):
-            effective_to_date = doc.get("effective_to")
-            if isinstance(effective_to_date, date):
-                match["effective_to"] = datetime.combine(effective_to_date, datetime.min.time())
-            else:
-                match["effective_to"] = effective_to_date
-    if doc.get("store_id"):
-        match["store_id"] = doc.get("store_id")
-
-    existing = db.shift_schedules.find_one(match)
-    if existing:
-        # Overwrite notes and any changes
-        update_doc = {k: v for k, v in doc.items() if k not in ["staff_id"]}
-        
-        # Convert datetime.date to datetime.datetime for MongoDB compatibility in update
-        if update_doc.get("effective_from") and isinstance(update_doc.get("effective_from"), date):
-            update_doc["effective_from"] = datetime.combine(update_doc["effective_from"], datetime.min.time())
-        if update_doc.get("effective_to") and isinstance(update_doc.get("effective_to"), date):
-            update_doc["effective_to"] = datetime.combine(update_doc["effective_to"], datetime.min.time())
-        
-        db.shift_schedules.update_one({"_id": existing["_id"]}, {"$set": update_doc})
-        return jsonify({"id": str(existing["_id"]), "updated": True}), 200
-
-    # Insert new
-    doc["created_at"] = _now(db)
-    
-    # Convert datetime.date to datetime.datetime for MongoDB storage
-    from datetime import date
-    if doc.get("effective_from") and isinstance(doc.get("effective_from"), date):
-        doc["effective_from"] = datetime.combine(doc["effective_from"], datetime.min.time())
-    if doc.get("effective_to") and isinstance(doc.get("effective_to"), date):
-        doc["effective_to"] = datetime.combine(doc["effective_to"], datetime.min.time())
-    
-    ins = db.shift_schedules.insert_one(doc)
-    return jsonify({"id": str(ins.inserted_id), "created": True}), 201
+    # Upsert on the duplicate key: an identical schedule is overwritten
+    # (notes and any other changes), otherwise a new one is inserted
+    doc["dedupe_key"] = schedule_dedupe_key(doc)
+    update_doc = {k: v for k, v in doc.items() if k != "staff_id"}
+    new_id = ObjectId()
+    try:
+        saved = db.shift_schedules.find_one_and_update(
+            {"dedupe_key": doc["dedupe_key"]},
+            {
+                "$set": update_doc,
+                "$setOnInsert": {"_id": new_id, "staff_id": doc["staff_id"], "created_at": _now()},
+            },
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # A concurrent create inserted the same schedule between match and insert
+        return jsonify({"error": "duplicate_schedule"}), 409
+    if saved["_id"] != new_id:
+        return jsonify({"id": str(saved["_id"]), "updated": True}), 200
+    return jsonify({"id": str(new_id), "created": True}), 201
 
 @bp.put("/shift-schedules/<sid>")
 @jwt_required()
 @require_permissions("staff.manage")
 def update_shift_schedule(sid):
+    _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
+    oid = _oid(sid)
+    if oid is None:
+        return jsonify({"error": "invalid_id"}), 400
     try:
-        payload = ShiftScheduleSchema(partial=True).load(request.get_json() or {})
+        payload = _SHIFT_SCHEDULE_PARTIAL_SCHEMA.load(request.get_json() or {})
     except ValidationError as err:
         return jsonify({"error": "validation_failed", "details": err.messages}), 400
     
-    # Convert datetime.date to datetime.datetime for MongoDB compatibility
-    from datetime import datetime, date
-    if payload.get("effective_from") and isinstance(payload.get("effective_from"), date):
-        payload["effective_from"] = datetime.combine(payload["effective_from"], datetime.min.time())
-    if payload.get("effective_to") and isinstance(payload.get("effective_to"), date):
-        payload["effective_to"] = datetime.combine(payload["effective_to"], datetime.min.time())
-    
-    res = db.shift_schedules.update_one({"_id": _oid(sid)}, {"$set": payload})
+    update = dict(payload)
+    if any(k in payload for k in SCHEDULE_KEY_FIELDS):
+        # Recompute the dedupe key from the schedule as it will be stored
+        current = db.shift_schedules.find_one({"_id": oid}, {"staff_id": 1, **{k: 1 for k in SCHEDULE_KEY_FIELDS}})
+        if not current:
+            return jsonify({"error": "not_found"}), 404
+        update["dedupe_key"] = schedule_dedupe_key({**current, **payload})
+    try:
+        res = db.shift_schedules.update_one({"_id": oid}, {"$set": update})
+    except DuplicateKeyError:
+        # uniq_dedupe_key: the edit would make this an identical copy of another schedule
+        return jsonify({"error": "duplicate_schedule"}), 409
     if res.matched_count == 0:
         return jsonify({"error": "not_found"}), 404
     return jsonify({"updated": True})
@@ -416,25 +649,30 @@ def update_shift_schedule(sid):
 @require_permissions("staff.manage")
 def delete_shift_schedule(sid):
     db = current_app.extensions['mongo_db']
-    res = db.shift_schedules.delete_one({"_id": _oid(sid)})
+    oid = _oid(sid)
+    if oid is None:
+        return jsonify({"error": "invalid_id"}), 400
+    res = db.shift_schedules.delete_one({"_id": oid})
     return jsonify({"deleted": res.deleted_count > 0})
 
 @bp.get("/shift-schedules")
 @jwt_required()
 @require_permissions("shift.view")
 def query_shift_schedules():
+    _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
-    from_dt = request.args.get("from")
-    to_dt = request.args.get("to")
+    from_dt, to_dt, bad_range = _parse_range_args()
+    if bad_range:
+        return jsonify({"error": "validation_failed", "details": bad_range}), 400
     store_id = request.args.get("store_id")
     filt = {}
     if store_id:
         filt["store_id"] = store_id
     # naive range filter on effective dates (optional)
     if from_dt:
-        filt["effective_from"] = {"$gte": datetime.fromisoformat(from_dt)}
+        filt.setdefault("effective_from", {})["$gte"] = from_dt
     if to_dt:
-        filt.setdefault("effective_to", {})["$lte"] = datetime.fromisoformat(to_dt)
+        filt.setdefault("effective_to", {})["$lte"] = to_dt
     items = []
     for s in db.shift_schedules.find(filt).limit(200):
         s["id"] = str(s.pop("_id"))
@@ -450,29 +688,31 @@ def query_shift_schedules():
 @jwt_required()
 @require_permissions("shift.view")
 def list_shift_logs():
+    _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
     staff_id = request.args.get("staff_id")
-    from_dt = request.args.get("from")
-    to_dt = request.args.get("to")
+    from_dt, to_dt, bad_range = _parse_range_args()
+    if bad_range:
+        return jsonify({"error": "validation_failed", "details": bad_range}), 400
     store_id = request.args.get("store_id")
     filt = {}
-    if staff_id and _oid(staff_id):
-        filt["staff_id"] = str(_oid(staff_id))
+    staff_oid = _oid(staff_id) if staff_id else None
+    if staff_oid:
+        filt["staff_id"] = str(staff_oid)
     if store_id:
         filt["store_id"] = store_id
     if from_dt:
-        filt["clock_in"] = {"$gte": datetime.fromisoformat(from_dt)}
+        filt.setdefault("clock_in", {})["$gte"] = from_dt
     if to_dt:
-        filt.setdefault("clock_out", {})["$lte"] = datetime.fromisoformat(to_dt)
-    logs = []
-    for l in db.shift_logs.find(filt).sort("clock_in", -1).limit(500):
-        l["id"] = str(l.pop("_id"))
-        # Ensure all ObjectIds are converted to strings
-        for key, value in l.items():
-            if isinstance(value, ObjectId):
-                l[key] = str(value)
-        logs.append(l)
-    return jsonify({"items": logs})
+        filt.setdefault("clock_out", {})["$lte"] = to_dt
+    cursor = db.shift_logs.find(filt).sort("clock_in", -1).limit(500)
+
+    def _rows():
+        for l in cursor:
+            l["id"] = l.pop("_id")
+            yield l
+
+    return stream_list("items", _rows())
 
 @bp.post("/shift-logs")
 @jwt_required()
@@ -480,10 +720,40 @@ def list_shift_logs():
 def create_shift_log():
     db = current_app.extensions['mongo_db']
     try:
-        payload = ShiftLogSchema().load(request.get_json() or {})
+        payload = _SHIFT_LOG_SCHEMA.load(request.get_json() or {})
     except ValidationError as err:
         return jsonify({"error": "validation_failed", "details": err.messages}), 400
-    doc = dict(payload)
-    doc["staff_id"] = str(_oid(payload["staff_id"]))
-    ins = db.shift_logs.insert_one(doc)
+    ins = db.shift_logs.insert_one(payload)
     return jsonify({"id": str(ins.inserted_id)}), 201
+
+# Upper bound on logs per bulk request; keeps a single insert_many well
+# under the 48MB batch Mongo would otherwise split
+_SHIFT_LOG_BULK_MAX = 1000
+
+@bp.post("/shift-logs/bulk")
+@jwt_required()
+@require_permissions("shift.view")
+def create_shift_logs_bulk():
+    """Insert a batch of shift logs (e.g. end-of-day tablet uploads) in one round-trip."""
+    _ensure_indexes_once()
+    db = current_app.extensions['mongo_db']
+    body = request.get_json(silent=True)
+    if not isinstance(body, list) or not body:
+        return jsonify({"error": "validation_failed", "details": {"_schema": ["expected a non-empty list"]}}), 400
+    if len(body) > _SHIFT_LOG_BULK_MAX:
+        return jsonify({"error": "validation_failed", "details": {"_schema": [f"at most {_SHIFT_LOG_BULK_MAX} logs per request"]}}), 400
+    try:
+        docs = _SHIFT_LOG_SCHEMA.load(body, many=True)
+    except ValidationError as err:
+        return jsonify({"error": "validation_failed", "details": err.messages}), 400
+
+    try:
+        res = db.shift_logs.insert_many(docs, ordered=False)
+    except BulkWriteError as err:
+        # Unordered: every log that could be written was; report the rest
+        details = err.details or {}
+        return jsonify({
+            "inserted": details.get("nInserted", 0),
+            "errors": [{"index": e.get("index"), "message": e.get("errmsg")} for e in details.get("writeErrors", [])],
+        }), 207
+    return jsonify({"inserted": len(res.inserted_ids), "ids": [str(i) for i in res.inserted_ids]}), 201
@@ -1,14 +1,19 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
 from app.utils.authz import require_permissions
+from app.utils.json_stream import stream_list
 from bson import ObjectId
-from marshmallow import Schema, fields, ValidationError
+from pymongo.errors import DuplicateKeyError
+from marshmallow import Schema, fields, validate, ValidationError
 from datetime import datetime
 import logging
+import time
 
 log = logging.getLogger(__name__)
 bp = Blueprint("stores", __name__, url_prefix="/stores")
 
+_STATUS_CHOICES = ("active", "inactive")
+
 # ---- Schemas ----
 class StoreSchema(Schema):
     name = fields.String(required=True)
@@ -20,7 +25,7 @@ class StoreSchema(Schema):
     latitude = fields.Float(required=False)
     longitude = fields.Float(required=False)
     opening_hours = fields.String(required=False)  # e.g., "10:00 AM - 8:00 PM"
-    status = fields.String(validate=lambda v: v in ["active", "inactive"], required=False, load_default="active")
+    status = fields.String(validate=validate.OneOf(_STATUS_CHOICES), required=False, load_default="active")
 
 class StoreUpdateSchema(Schema):
     name = fields.String(required=False)
@@ -32,7 +37,17 @@ class StoreUpdateSchema(Schema):
     latitude = fields.Float(required=False)
     longitude = fields.Float(required=False)
     opening_hours = fields.String(required=False)
-    status = fields.String(validate=lambda v: v in ["active", "inactive"], required=False)
+    status = fields.String(validate=validate.OneOf(_STATUS_CHOICES), required=False)
+
+# Reused across requests instead of rebuilt per call
+_STORE_SCHEMA = StoreSchema()
+_STORE_UPDATE_SCHEMA = StoreUpdateSchema()
+
+# Fields returned by list_stores
+_STORE_LIST_PROJECTION = {
+    "name": 1, "location": 1, "address": 1, "phone": 1, "email": 1, "manager": 1,
+    "latitude": 1, "longitude": 1, "opening_hours": 1, "status": 1, "created_at": 1,
+}
 
 # ---- Helpers ----
 def _oid(id_str: str):
@@ -41,40 +56,96 @@ def _oid(id_str: str):
     except Exception:
         return None
 
-def _now(db):
+def _now():
+    # Local UTC clock; avoids an isMaster round-trip on every write
+    return datetime.utcnow()
+
+# Case-insensitive comparison shared by uniq_name_ci and its fallback pre-check
+_NAME_COLLATION = {"locale": "en", "strength": 2}
+
+def _ensure_indexes():
+    """Create indexes for store queries. Safe to call repeatedly.
+
+    Returns False when uniq_name_ci could not be built.
+    """
+    db = current_app.extensions['mongo_db']
+    unique_ready = True
+    try:
+        db.stores.create_index([("status", 1), ("created_at", -1)], name="status_created_desc")
+    except Exception:
+        pass
     try:
-        is_master = db.command("isMaster")
-        return is_master.get("localTime")
+        # Case-insensitive unique store names
+        db.stores.create_index(
+            [("name", 1)],
+            name="uniq_name_ci",
+            unique=True,
+            collation=_NAME_COLLATION,
+        )
     except Exception:
-        return datetime.utcnow()
+        # Duplicate names or a conflicting name index;
+        # scripts/ensure_unique_indexes.py reports both
+        log.exception("uniq_name_ci index missing; store writes fall back to a name pre-check")
+        unique_ready = False
+    return unique_ready
+
+
+_INDEXES_READY = False
+# A failed unique build (e.g. duplicate data) is retried at most this often
+_INDEX_RETRY_SECONDS = 300
+_indexes_retry_at = 0.0
+
+def _ensure_indexes_once():
+    """Ensure indexes; True once uniq_name_ci exists."""
+    global _INDEXES_READY, _indexes_retry_at
+    if _INDEXES_READY:
+        return True
+    now = time.monotonic()
+    if now < _indexes_retry_at:
+        return False
+    _indexes_retry_at = now + _INDEX_RETRY_SECONDS
+    try:
+        _INDEXES_READY = _ensure_indexes()
+    except Exception:
+        # Ignore index failures for request path; a later request retries
+        pass
+    return _INDEXES_READY
+
+def _name_taken(db, name, exclude_oid=None):
+    """Pre-check used only while uniq_name_ci is missing."""
+    query = {"name": name}
+    if exclude_oid is not None:
+        query["_id"] = {"$ne": exclude_oid}
+    return db.stores.find_one(query, {"_id": 1}, collation=_NAME_COLLATION) is not None
 
 # ---- Store CRUD ----
 @bp.get("")
 def list_stores():
     """List all stores (public endpoint)"""
+    _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
     
     try:
-        stores = list(db.stores.find({"status": "active"}).sort("created_at", -1))
+        cursor = db.stores.find({"status": "active"}, _STORE_LIST_PROJECTION).sort("created_at", -1)
         
-        store_list = []
-        for store in stores:
-            store_list.append({
-                "id": str(store["_id"]),
-                "name": store.get("name", ""),
-                "location": store.get("location", ""),
-                "address": store.get("address", ""),
-                "phone": store.get("phone", ""),
-                "email": store.get("email", ""),
-                "manager": store.get("manager", ""),
-                "latitude": store.get("latitude"),
-                "longitude": store.get("longitude"),
-                "opening_hours": store.get("opening_hours", ""),
-                "status": store.get("status", "active"),
-                "created_at": store.get("created_at"),
-            })
+        def _rows():
+            for store in cursor:
+                yield {
+                    "id": store["_id"],
+                    "name": store.get("name", ""),
+                    "location": store.get("location", ""),
+                    "address": store.get("address", ""),
+                    "phone": store.get("phone", ""),
+                    "email": store.get("email", ""),
+                    "manager": store.get("manager", ""),
+                    "latitude": store.get("latitude"),
+                    "longitude": store.get("longitude"),
+                    "opening_hours": store.get("opening_hours", ""),
+                    "status": store.get("status", "active"),
+                    "created_at": store.get("created_at"),
+                }
         
-        return jsonify({"stores": store_list}), 200
+        return stream_list("stores", _rows())
     except Exception as e:
         log.error(f"Error listing stores: {str(e)}")
         return jsonify({"error": "Failed to list stores"}), 500
@@ -84,22 +155,20 @@ def list_stores():
 @require_permissions("*")
 def create_store():
     """Create a new store (admin only)"""
+    unique_name = _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
     
     log.info("create_store: Request received")
     try:
-        schema = StoreSchema()
-        data = schema.load(request.get_json())
-        
-        # Check if store with same name already exists
-        existing = db.stores.find_one({"name": data["name"]})
-        if existing:
+        data = _STORE_SCHEMA.load(request.get_json())
+        if not unique_name and _name_taken(db, data["name"]):
             return jsonify({"error": "Store with this name already exists"}), 409
         
+        now = _now()
         store_doc = {
             **data,
-            "created_at": _now(db),
-            "updated_at": _now(db),
+            "created_at": now,
+            "updated_at": now,
         }
         
         result = db.stores.insert_one(store_doc)
@@ -108,6 +177,9 @@ def create_store():
             "id": str(result.inserted_id),
             "message": "Store created successfully"
         }), 201
+    except DuplicateKeyError:
+        # uniq_name_ci rejects names differing only by case
+        return jsonify({"error": "Store with this name already exists"}), 409
     except ValidationError as e:
         return jsonify({"error": "Validation failed", "details": e.messages}), 400
     except Exception as e:
@@ -152,6 +224,7 @@ def get_store(store_id):
 @require_permissions("*")
 def update_store(store_id):
     """Update store details (admin only)"""
+    unique_name = _ensure_indexes_once()
     db = current_app.extensions['mongo_db']
     
     try:
@@ -159,21 +232,11 @@ def update_store(store_id):
         if not store_oid:
             return jsonify({"error": "Invalid store ID"}), 400
         
-        schema = StoreUpdateSchema()
-        data = schema.load(request.get_json())
-        
-        # Check if store exists
-        store = db.stores.find_one({"_id": store_oid})
-        if not store:
-            return jsonify({"error": "Store not found"}), 404
-        
-        # If updating name, check if it's already taken
-        if "name" in data and data["name"] != store.get("name"):
-            existing = db.stores.find_one({"name": data["name"]})
-            if existing:
-                return jsonify({"error": "Store with this name already exists"}), 409
+        data = _STORE_UPDATE_SCHEMA.load(request.get_json())
+        if not unique_name and "name" in data and _name_taken(db, data["name"], store_oid):
+            return jsonify({"error": "Store with this name already exists"}), 409
         
-        data["updated_at"] = _now(db)
+        data["updated_at"] = _now()
         
         result = db.stores.update_one(
             {"_id": store_oid},
@@ -184,6 +247,8 @@ def update_store(store_id):
             return jsonify({"error": "Store not found"}), 404
         
         return jsonify({"message": "Store updated successfully"}), 200
+    except DuplicateKeyError:
+        return jsonify({"error": "Store with this name already exists"}), 409
     except ValidationError as e:
         return jsonify({"error": "Validation failed", "details": e.messages}), 400
     except Exception as e:
@@ -251,7 +316,7 @@ def book_appointment(store_id):
             "preferred_time": data.get("preferred_time"),
             "notes": data.get("notes", ""),
             "status": "pending",
-            "created_at": _now(db),
+            "created_at": _now(),
         }
         
         result = db.appointments.insert_one(appointment)
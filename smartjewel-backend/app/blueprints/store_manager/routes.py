@@ -1,102 +1,194 @@
-from flask import Blueprint, request, jsonify, current_app
+import base64
+import re
+
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.utils.authz import require_any_role, require_permissions
+from app.utils.json_stream import dumps
+from app.utils.ttl_cache import MISSING
+from app.utils.user_cache import USER_STORE_OIDS
 from bson import ObjectId
+from pymongo import UpdateOne
 from datetime import datetime
 
 bp = Blueprint("store_manager", __name__, url_prefix="/api/store-manager")
 
 
 def _oid(id_str):
+    if isinstance(id_str, ObjectId):
+        return id_str
     try:
         return ObjectId(id_str)
     except Exception:
         return None
 
 
+def _user_store_oid(db, user_id):
+    """Return the ObjectId of the store assigned to user_id, or None if there is none.
+
+    Cached briefly in USER_STORE_OIDS, including "no store", so unassigned
+    users don't re-read Mongo on every request; update_staff evicts it when
+    the user's store assignment changes.
+    """
+    store_oid = USER_STORE_OIDS.get(user_id)
+    if store_oid is not MISSING:
+        return store_oid
+
+    user = db.users.find_one({"_id": _oid(user_id)}, {"store_id": 1})
+    # Converted once here so handlers reuse the cached ObjectId
+    store_id = (user or {}).get("store_id")
+    store_oid = _oid(store_id) if store_id else None
+    USER_STORE_OIDS.set(user_id, store_oid)
+    return store_oid
+
+
+def _ensure_indexes():
+    """Create indexes for store manager queries. Safe to call repeatedly."""
+    db = current_app.extensions['mongo_db']
+    try:
+        # Equality on store_id/deleted, then the list sort keys
+        db.orders.create_index(
+            [("store_id", 1), ("deleted", 1), ("createdAt", -1), ("_id", -1)],
+            name="store_createdAt_id_desc",
+        )
+    except Exception:
+        pass
+    try:
+        db.orders.create_index(
+            [("store_id", 1), ("status", 1), ("createdAt", -1)],
+            name="store_status_createdAt_desc",
+        )
+    except Exception:
+        pass
+    try:
+        db.orders.create_index([("store_id", 1), ("customer_search", 1)], name="store_customer_search")
+    except Exception:
+        pass
+    try:
+        db.appointments.create_index([("store_id", 1), ("created_at", -1)], name="store_created_at_desc")
+    except Exception:
+        pass
+
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+_INDEXES_READY = False
+
+
+def _ensure_indexes_once():
+    global _INDEXES_READY
+    if _INDEXES_READY:
+        return
+    try:
+        _ensure_indexes()
+        _INDEXES_READY = True
+    except Exception:
+        # Ignore index failures for request path; subsequent requests can retry
+        pass
+
+
+def _encode_cursor(created_at: datetime, oid) -> str:
+    """Opaque keyset cursor for the (createdAt, _id) position of an order."""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{oid}".encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    """Return (createdAt, _id) from a cursor, or None if it is malformed."""
+    try:
+        ts, oid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(ts), ObjectId(oid)
+    except Exception:
+        return None
+
+
+_EMPTY = {}
+
+
 def _normalize_order(order: dict) -> dict:
+    # Called once per row on every page; bind .get and the nested dicts once
+    # instead of re-looking them up per field
     if not order:
         return {}
-    created_at = order.get("createdAt") or order.get("created_at") or order.get("_computedCreatedAt")
-    updated_at = order.get("updatedAt") or order.get("updated_at")
-    if isinstance(created_at, datetime):
-        created_at = created_at.isoformat()
-    if isinstance(updated_at, datetime):
-        updated_at = updated_at.isoformat()
-    amount_val = order.get("totalAmount")
+    get = order.get
+    amount_val = get("totalAmount")
     if amount_val is None:
-        amount_val = order.get("amount", 0)
+        amount_val = get("amount", 0)
+    po = get("provider_order") or _EMPTY
     payment = {
-        "provider": order.get("provider"),
-        "status": order.get("payment_status") or order.get("status"),  # Use our system status, not provider_order.status
-        "currency": (order.get("provider_order") or {}).get("currency"),
-        "amount": (order.get("provider_order") or {}).get("amount"),
-        "receipt": (order.get("provider_order") or {}).get("receipt"),
-        "transactionId": (order.get("provider_order") or {}).get("transactionId") or order.get("payment_id"),
+        "provider": get("provider"),
+        "status": get("payment_status") or get("status"),  # Use our system status, not provider_order.status
+        "currency": po.get("currency"),
+        "amount": po.get("amount"),
+        "receipt": po.get("receipt"),
+        "transactionId": po.get("transactionId") or get("payment_id"),
     }
-    shipping = order.get("shipping") if isinstance(order.get("shipping"), dict) else None
-    if not shipping:
+    shipping = get("shipping")
+    if not isinstance(shipping, dict) or not shipping:
         shipping = {
-            "address": (order.get("customer") or {}).get("address"),
+            "address": (get("customer") or _EMPTY).get("address"),
             "method": None,
-            "trackingId": order.get("tracking_number") or None,
-            "status": order.get("delivery_status") or None,
+            "trackingId": get("tracking_number") or None,
+            "status": get("delivery_status") or None,
         }
+    hist = get("statusHistory")
     return {
-        "orderId": str(order.get("_id", "")),
-        "items": order.get("items", []),
-        "statusHistory": order.get("statusHistory", []),
+        "orderId": str(get("_id", "")),
+        "items": get("items", []),
+        "statusHistory": get("statusHistory", []),
         "shipping": shipping,
         "amount": amount_val,
         "payment": payment,
-        "createdAt": created_at,
-        "updatedAt": updated_at,
-        "customer": order.get("customer"),
-        "status": (order.get("statusHistory") or [{}])[-1].get("status") if order.get("statusHistory") else order.get("status"),
-        "cancellation": order.get("cancellation") or {},
+        # Datetimes pass through; the orjson encoder emits them as ISO 8601
+        "createdAt": get("createdAt") or get("created_at"),
+        "updatedAt": get("updatedAt") or get("updated_at"),
+        "customer": get("customer"),
+        "status": hist[-1].get("status") if hist else get("status"),
+        "cancellation": get("cancellation") or {},
     }
 
 
-def _maybe_auto_mark_paid(db, order: dict):
+def _maybe_auto_mark_paid(order: dict):
     """Auto-mark Razorpay orders as paid if they have a payment_id (indicating successful payment).
     We ignore provider_order.status since Razorpay keeps it as 'created' even after payment.
+
+    Updates the order in memory for the current response and returns
+    ``(order, op)``, where ``op`` is the UpdateOne to persist it or None.
+    The caller batches the ops into one bulk_write.
     """
     if not order:
-        return order
+        return order, None
     
     # Only process Razorpay orders that have a payment_id (successful payment indicator)
     is_razorpay = order.get("provider") == "razorpay" or order.get("payment_provider") == "razorpay"
     has_payment_id = bool(order.get("payment_id") or order.get("razorpay_payment_id"))
     
     if not (is_razorpay and has_payment_id):
-        return order
+        return order, None
     
-    # Check if already marked paid in our system status
+    # Check if already marked paid in our system status. payment_status is
+    # set alongside status by every paid write and survives later status
+    # changes (shipped, delivered), so most orders stop here
     current_status = (order.get("status") or "").lower()
-    if current_status == "paid":
-        return order
+    if current_status == "paid" or order.get("payment_status") == "paid":
+        return order, None
     
-    # Also check statusHistory for paid status
+    # Legacy orders without payment_status: check statusHistory for paid status
     hist = order.get("statusHistory") or []
     already_paid = any((h.get("status") or "").lower() == "paid" for h in hist)
     if already_paid:
-        return order
+        return order, None
     
     now = datetime.utcnow()
-    try:
-        db.orders.update_one({"_id": order.get("_id")}, {
-            "$push": {"statusHistory": {"status": "paid", "timestamp": now, "by": "system:auto", "notes": "Razorpay payment confirmed via payment_id"}},
-            "$set": {"status": "paid", "payment_status": "paid", "updatedAt": now}
-        })
-        # Reflect in-memory for current response
-        (order.setdefault("statusHistory", [])).append({"status": "paid", "timestamp": now})
-        order["status"] = "paid"
-        order["payment_status"] = "paid"
-        print(f"Auto-marked order {order.get('_id')} as paid (had payment_id: {order.get('payment_id')})")
-    except Exception as e:
-        print(f"Failed to auto-mark order {order.get('_id')} as paid: {e}")
-    
-    return order
+    op = UpdateOne({"_id": order.get("_id")}, {
+        "$push": {"statusHistory": {"status": "paid", "timestamp": now, "by": "system:auto", "notes": "Razorpay payment confirmed via payment_id"}},
+        "$set": {"status": "paid", "payment_status": "paid", "updatedAt": now}
+    })
+    # Reflect in-memory for current response
+    (order.setdefault("statusHistory", [])).append({"status": "paid", "timestamp": now})
+    order["status"] = "paid"
+    order["payment_status"] = "paid"
+    return order, op
 
 
 @bp.route("/orders", methods=["GET"])
@@ -107,15 +199,14 @@ def list_store_orders():
     db = current_app.extensions.get('mongo_db')
     if db is None:
         return jsonify({"orders": [], "message": "Database not available"}), 503
+    _ensure_indexes_once()
 
     # Get current user to determine their store
     user_id = get_jwt_identity()
-    user = db.users.find_one({"_id": _oid(user_id)})
-    if not user or not user.get("store_id"):
+    store_oid = _user_store_oid(db, user_id)
+    if not store_oid:
         return jsonify({"error": "no_store_assigned"}), 400
 
-    store_id = user.get("store_id")
-
     # Pagination
     page = max(int(request.args.get("page", 1)), 1)
     limit = min(max(int(request.args.get("limit", 20)), 1), 100)
@@ -124,6 +215,17 @@ def list_store_orders():
     # Sorting: newest first by default (createdAt/created_at desc)
     sort_by = request.args.get("sortBy")
     sort_dir = -1 if (request.args.get("sortDir") or "desc").lower() in ("desc", "-1") else 1
+    if not sort_by:
+        sort_dir = -1
+    by_created = not sort_by or sort_by in ("createdAt", "created_at")
+
+    # Keyset cursor (?after=) from the previous page's nextCursor. Seeking
+    # past (createdAt, _id) replaces $skip, so deep pages cost the same as
+    # the first; only available for the createdAt ordering
+    after = request.args.get("after") if by_created else None
+    position = _decode_cursor(after) if after else None
+    if after and position is None:
+        return jsonify({"error": "invalid_cursor"}), 400
 
     # Filters
     status = (request.args.get("status") or "").strip().lower()  # created/paid/shipped/delivered/cancelled
@@ -131,35 +233,39 @@ def list_store_orders():
     date_from = request.args.get("from")
     date_to = request.args.get("to")
 
-    # Build query to filter orders for this store
-    query = {"store_id": _oid(store_id)}
+    # Build query to filter orders for this store as one flat document so
+    # the planner sees store_id/deleted/createdAt directly. Logical
+    # deletions are excluded globally; only the $or clauses need an $and
+    query = {"store_id": store_oid, "deleted": {"$ne": True}}
     ands = []
 
     if status:
-        # Match last status in statusHistory or legacy status
-        ands.append({
-            "$or": [
-                {"statusHistory": {"$elemMatch": {"status": {"$regex": f"^{status}$", "$options": "i"}}}},
-                {"status": {"$regex": f"^{status}$", "$options": "i"}}
-            ]
-        })
+        # The current status only (update_order_status keeps the top-level
+        # field in step with statusHistory); stored lowercase, so plain
+        # equality can use store_status_createdAt_desc
+        query["status"] = status
 
     if q:
         try:
             maybe_oid = ObjectId(q)
         except Exception:
             maybe_oid = None
+        # Anchored, case-sensitive prefixes on the lowercased search terms
+        # can use the store_customer_search index; phone-like input is also
+        # tried as bare digits
+        prefixes = [q]
+        digits = _NON_DIGITS.sub("", q)
+        if digits and digits != q and len(digits) >= 3:
+            prefixes.append(digits)
         ors = [
-            {"customer.name": {"$regex": q, "$options": "i"}},
-            {"customer.email": {"$regex": q, "$options": "i"}},
-            {"customer.phone": {"$regex": q, "$options": "i"}},
+            {"customer_search": {"$in": [re.compile("^" + re.escape(p)) for p in prefixes]}},
         ]
         if maybe_oid:
             ors.append({"_id": maybe_oid})  # type: ignore
         ands.append({"$or": ors})
 
-    # Date range on createdAt/created_at
-    dr_or = []
+    # Date range on createdAt (backfilled from created_at / _id for legacy
+    # orders by scripts/backfill_order_created_at.py)
     rng = {}
     if date_from:
         try:
@@ -172,55 +278,67 @@ def list_store_orders():
         except Exception:
             pass
     if rng:
-        dr_or.append({"createdAt": rng})
-        dr_or.append({"created_at": rng})
-        ands.append({"$or": dr_or})
-
-    if ands:
+        query["createdAt"] = rng
+    if position:
+        cmp = "$lt" if sort_dir == -1 else "$gt"
+        ands.append({"$or": [
+            {"createdAt": {cmp: position[0]}},
+            {"createdAt": position[0], "_id": {cmp: position[1]}},
+        ]})
+
+    if len(ands) == 1:
+        query.update(ands[0])
+    elif ands:
         query["$and"] = ands  # type: ignore
-    else:
-        query = {"store_id": _oid(store_id)}
-    # Exclude logical deletions globally
-    query = {"$and": [query, {"deleted": {"$ne": True}}]}
 
-    # Build aggregation to compute a consistent created date for sorting and display
-    total = db.orders.count_documents(query)
-    pipeline = [
-        {"$match": query},
-        {"$addFields": {
-            "_createdAtConv": {"$convert": {"input": "$createdAt", "to": "date", "onError": None, "onNull": None}},
-            "_created_atConv": {"$convert": {"input": "$created_at", "to": "date", "onError": None, "onNull": None}},
-        }},
-        {"$addFields": {
-            "_sortDate": {"$ifNull": ["$_createdAtConv", {"$ifNull": ["$_created_atConv", {"$toDate": "$_id"}]}]},
-            "_computedCreatedAt": {"$ifNull": ["$_createdAtConv", {"$ifNull": ["$_created_atConv", {"$toDate": "$_id"}]}]},
-        }},
-    ]
-    # Sorting
-    if sort_by:
-        if sort_by in ("createdAt", "created_at"):
-            pipeline.append({"$sort": {"_sortDate": sort_dir}})
-        else:
-            pipeline.append({"$sort": {sort_by: sort_dir, "_sortDate": -1}})
+    # Sort on the stored (createdAt, _id) so store_createdAt_id_desc serves
+    # the sort and the page window without an in-memory sort. Cursor pages
+    # skip the full count
+    total = None if position else db.orders.count_documents(query)
+    if by_created:
+        sort = {"createdAt": sort_dir, "_id": sort_dir}
     else:
-        pipeline.append({"$sort": {"_sortDate": -1}})
-
-    pipeline.extend([{"$skip": skip}, {"$limit": limit}])
+        sort = {sort_by: sort_dir, "createdAt": -1, "_id": -1}
+    pipeline = [{"$match": query}, {"$sort": sort}]
+    if not position:
+        pipeline.append({"$skip": skip})
+    pipeline.append({"$limit": limit})
 
     cursor = db.orders.aggregate(pipeline)
     orders = []
+    pending = []
+    last = None
     for doc in cursor:
-        # best-effort: try to fetch full order for payment/provider fields not in pipeline
-        full = db.orders.find_one({"_id": doc.get("_id")}) or doc
-        full = _maybe_auto_mark_paid(db, full)
-        orders.append(_normalize_order(full))
+        last = doc
+        doc, op = _maybe_auto_mark_paid(doc)
+        if op is not None:
+            pending.append(op)
+        orders.append(_normalize_order(doc))
+
+    if pending:
+        # Best-effort: one round-trip for every auto-paid order on the page
+        try:
+            db.orders.bulk_write(pending, ordered=False)
+            current_app.logger.info("Auto-marked %d orders as paid (had payment_id)", len(pending))
+        except Exception:
+            current_app.logger.exception("Failed to auto-mark %d orders as paid", len(pending))
 
-    return jsonify({
+    next_cursor = None
+    if by_created and last is not None and len(orders) == limit and isinstance(last.get("createdAt"), datetime):
+        next_cursor = _encode_cursor(last["createdAt"], last["_id"])
+    if position:
+        pagination = {"limit": limit, "after": after, "nextCursor": next_cursor}
+    else:
+        pagination = {"page": page, "limit": limit, "total": total, "pages": (total + limit - 1) // limit, "nextCursor": next_cursor}
+
+    # orjson encodes the page (nested items/statusHistory included) several
+    # times faster than the stdlib provider behind jsonify
+    return Response(dumps({
         "orders": orders,
-        "pagination": {"page": page, "limit": limit, "total": total, "pages": (total + limit - 1) // limit},
+        "pagination": pagination,
         "sort": {"by": sort_by or ["createdAt","created_at"], "dir": "desc" if sort_dir == -1 else "asc"},
         "filters": {"status": status or None, "q": q or None, "from": date_from, "to": date_to}
-    })
+    }), mimetype="application/json")
 
 
 @bp.route("/orders/summary", methods=["GET"])
@@ -234,29 +352,35 @@ def get_store_orders_summary():
 
     # Get current user to determine their store
     user_id = get_jwt_identity()
-    user = db.users.find_one({"_id": _oid(user_id)})
-    if not user or not user.get("store_id"):
+    store_oid = _user_store_oid(db, user_id)
+    if not store_oid:
         return jsonify({"error": "no_store_assigned"}), 400
 
-    store_id = user.get("store_id")
-
     # Build query to filter orders for this store
-    query = {"store_id": _oid(store_id), "deleted": {"$ne": True}}
-
-    # Get total orders count
-    total_orders = db.orders.count_documents(query)
-
-    # Get delivered orders count
-    delivered_query = {"$and": [query, {"status": "delivered"}]}
-    delivered_count = db.orders.count_documents(delivered_query)
+    query = {"store_id": store_oid, "deleted": {"$ne": True}}
 
-    # Get paid orders count
-    paid_query = {"$and": [query, {"status": "paid"}]}
-    paid_count = db.orders.count_documents(paid_query)
+    # All four counts in one pass over the store's orders. Keep this
+    # pipeline free of $sort: order is irrelevant to the counts, and a sort
+    # stage before $group is blocking and can push the planner off the
+    # store_id index onto a sort-serving one
+    def _count_status(value):
+        return {"$sum": {"$cond": [{"$eq": ["$status", value]}, 1, 0]}}
 
-    # Get pending orders count (created status)
-    pending_query = {"$and": [query, {"status": "created"}]}
-    pending_count = db.orders.count_documents(pending_query)
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "delivered": _count_status("delivered"),
+            "paid": _count_status("paid"),
+            "pending": _count_status("created"),
+        }},
+    ]
+    counts = next(db.orders.aggregate(pipeline), None) or {}
+    total_orders = counts.get("total", 0)
+    delivered_count = counts.get("delivered", 0)
+    paid_count = counts.get("paid", 0)
+    pending_count = counts.get("pending", 0)
 
     return jsonify({
         "totalOrders": total_orders,
@@ -277,11 +401,9 @@ def update_order_status(order_id: str):
     
     # Get current user to determine their store
     user_id = get_jwt_identity()
-    user = db.users.find_one({"_id": _oid(user_id)})
-    if not user or not user.get("store_id"):
+    store_oid = _user_store_oid(db, user_id)
+    if not store_oid:
         return jsonify({"error": "no_store_assigned"}), 400
-
-    store_id = user.get("store_id")
     
     try:
         oid = ObjectId(order_id)
@@ -289,7 +411,7 @@ def update_order_status(order_id: str):
         return jsonify({"error": "invalid_order_id"}), 400
 
     # Verify order belongs to this store
-    order = db.orders.find_one({"_id": oid, "store_id": _oid(store_id)})
+    order = db.orders.find_one({"_id": oid, "store_id": store_oid})
     if not order:
         return jsonify({"error": "order_not_found_or_unauthorized"}), 404
 
@@ -332,6 +454,22 @@ def update_order_status(order_id: str):
     return jsonify({"order": _normalize_order(doc)})
 
 
+_APPOINTMENTS_PAGE_MAX = 200
+
+_APPOINTMENT_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "customer_name": {"$ifNull": ["$customer_name", ""]},
+    "customer_email": {"$ifNull": ["$customer_email", ""]},
+    "customer_phone": {"$ifNull": ["$customer_phone", ""]},
+    "preferred_date": {"$ifNull": ["$preferred_date", ""]},
+    "preferred_time": {"$ifNull": ["$preferred_time", ""]},
+    "notes": {"$ifNull": ["$notes", ""]},
+    "status": {"$ifNull": ["$status", "pending"]},
+    "created_at": {"$ifNull": ["$created_at", ""]},
+}
+
+
 @bp.route("/appointments", methods=["GET"])
 @require_permissions("appointments.manage")  # Store Manager
 @jwt_required()
@@ -340,34 +478,34 @@ def list_store_appointments():
     db = current_app.extensions.get('mongo_db')
     if db is None:
         return jsonify({"appointments": [], "message": "Database not available"}), 503
+    _ensure_indexes_once()
 
     # Get current user to determine their store
     user_id = get_jwt_identity()
-    user = db.users.find_one({"_id": _oid(user_id)})
-    if not user or not user.get("store_id"):
+    store_oid = _user_store_oid(db, user_id)
+    if not store_oid:
         return jsonify({"error": "no_store_assigned"}), 400
 
-    store_id = user.get("store_id")
-
-    # Get appointments for this store
-    appointments = list(db.appointments.find({"store_id": _oid(store_id)}).sort("created_at", -1))
-
-    # Normalize appointment data
-    normalized_appointments = []
-    for appointment in appointments:
-        normalized_appointments.append({
-            "id": str(appointment.get("_id", "")),
-            "customer_name": appointment.get("customer_name", ""),
-            "customer_email": appointment.get("customer_email", ""),
-            "customer_phone": appointment.get("customer_phone", ""),
-            "preferred_date": appointment.get("preferred_date", ""),
-            "preferred_time": appointment.get("preferred_time", ""),
-            "notes": appointment.get("notes", ""),
-            "status": appointment.get("status", "pending"),
-            "created_at": appointment.get("created_at", "").isoformat() if isinstance(appointment.get("created_at"), datetime) else appointment.get("created_at", "")
-        })
+    # Pagination; the default page is large enough for the dashboard's
+    # single fetch but keeps the response bounded
+    page = max(int(request.args.get("page", 1)), 1)
+    limit = min(max(int(request.args.get("limit", _APPOINTMENTS_PAGE_MAX)), 1), _APPOINTMENTS_PAGE_MAX)
+
+    # Shape the response in the $project stage so Python only lists the
+    # cursor; created_at stays a datetime for the JSON encoder to format.
+    # store_created_at_desc serves the match, sort and page window
+    appointments = list(db.appointments.aggregate([
+        {"$match": {"store_id": store_oid}},
+        {"$sort": {"created_at": -1}},
+        {"$skip": (page - 1) * limit},
+        {"$limit": limit},
+        {"$project": _APPOINTMENT_PROJECTION},
+    ]))
 
-    return jsonify({"appointments": normalized_appointments})
+    return jsonify({
+        "appointments": appointments,
+        "pagination": {"page": page, "limit": limit, "hasMore": len(appointments) == limit},
+    })
 
 
 @bp.route("/appointments/<appointment_id>/<action>", methods=["PATCH"])
@@ -381,11 +519,9 @@ def update_appointment_status(appointment_id: str, action: str):
     
     # Get current user to determine their store
     user_id = get_jwt_identity()
-    user = db.users.find_one({"_id": _oid(user_id)})
-    if not user or not user.get("store_id"):
+    store_oid = _user_store_oid(db, user_id)
+    if not store_oid:
         return jsonify({"error": "no_store_assigned"}), 400
-
-    store_id = user.get("store_id")
     
     try:
         oid = ObjectId(appointment_id)
@@ -393,7 +529,7 @@ def update_appointment_status(appointment_id: str, action: str):
         return jsonify({"error": "invalid_appointment_id"}), 400
 
     # Verify appointment belongs to this store
-    appointment = db.appointments.find_one({"_id": oid, "store_id": _oid(store_id)})
+    appointment = db.appointments.find_one({"_id": oid, "store_id": store_oid})
     if not appointment:
         return jsonify({"error": "appointment_not_found_or_unauthorized"}), 404
 
@@ -5,24 +5,52 @@ Listens for Razorpay events (refunds, payments, etc.) and updates order status
 from flask import Blueprint, request, jsonify, current_app
 import hmac
 import hashlib
-import os
+import logging
 from datetime import datetime
+from functools import lru_cache
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app.services.whatsapp_service import get_whatsapp_service
+from app.utils import background
 
+log = logging.getLogger(__name__)
 bp = Blueprint('razorpay_webhook', __name__, url_prefix='/webhooks')
 
+def _ensure_indexes(db):
+    """Create indexes for webhook order lookups. Safe to call repeatedly."""
+    # Sparse: most orders carry only one of the two payment id fields
+    for field in ("payment_id", "razorpay_payment_id"):
+        try:
+            db.orders.create_index([(field, 1)], name=f"{field}_sparse", sparse=True)
+        except Exception:
+            pass
+
+_INDEXES_READY = False
+
+def _ensure_indexes_once(db):
+    global _INDEXES_READY
+    if _INDEXES_READY:
+        return
+    try:
+        _ensure_indexes(db)
+        _INDEXES_READY = True
+    except Exception:
+        # Ignore index failures for request path; subsequent requests can retry
+        pass
+
+@lru_cache(maxsize=4)
+def _secret_bytes(secret):
+    # The secret is fixed per deployment; encode it once
+    return secret.encode('utf-8')
+
 def verify_webhook_signature(body, signature, secret):
     """Verify Razorpay webhook signature"""
     try:
-        expected_signature = hmac.new(
-            secret.encode('utf-8'),
-            body,
-            hashlib.sha256
-        ).hexdigest()
+        # One-shot hmac.digest runs in C without building an HMAC object
+        expected_signature = hmac.digest(_secret_bytes(secret), body, hashlib.sha256).hex()
         return hmac.compare_digest(expected_signature, signature)
     except Exception as e:
-        print(f"Signature verification error: {e}")
+        log.warning("Signature verification error: %s", e)
         return False
 
 @bp.route("/razorpay", methods=["POST"])
@@ -34,13 +62,14 @@ def handle_razorpay_webhook():
     db = current_app.extensions.get('mongo_db')
     if db is None:
         return jsonify({"error": "db_unavailable"}), 503
+    _ensure_indexes_once(db)
     
-    # Get webhook secret from environment
-    webhook_secret = os.getenv("RAZORPAY_WEBHOOK_SECRET")
-    if not webhook_secret:
-        print("WARNING: RAZORPAY_WEBHOOK_SECRET not configured")
-        # In development, you might want to skip verification
-        # return jsonify({"error": "webhook_secret_not_configured"}), 500
+    # Read once into Config at startup; a missing secret is reported by
+    # Config.validate() in create_app rather than on every webhook
+    webhook_secret = current_app.config.get("RAZORPAY_WEBHOOK_SECRET")
+    # In development, you might want to skip verification
+    # if not webhook_secret:
+    #     return jsonify({"error": "webhook_secret_not_configured"}), 500
     
     # Get signature from headers
     signature = request.headers.get("X-Razorpay-Signature", "")
@@ -48,18 +77,18 @@ def handle_razorpay_webhook():
     
     # Verify signature (skip if secret not configured for development)
     if webhook_secret and not verify_webhook_signature(body, signature, webhook_secret):
-        print(f"Invalid webhook signature received")
+        log.warning("Invalid webhook signature received")
         return jsonify({"error": "invalid_signature"}), 401
     
     # Parse event data
     try:
         event = request.get_json()
     except Exception as e:
-        print(f"Failed to parse webhook JSON: {e}")
+        log.warning("Failed to parse webhook JSON: %s", e)
         return jsonify({"error": "invalid_json"}), 400
     
     event_type = event.get("event")
-    print(f"Received Razorpay webhook: {event_type}")
+    log.info("Received Razorpay webhook: %s", event_type)
     
     # Handle different event types
     if event_type and event_type.startswith("refund."):
@@ -67,7 +96,7 @@ def handle_razorpay_webhook():
     elif event_type and event_type.startswith("payment."):
         return handle_payment_event(db, event, event_type)
     else:
-        print(f"Unhandled webhook event type: {event_type}")
+        log.info("Unhandled webhook event type: %s", event_type)
         return jsonify({"status": "ignored", "event": event_type}), 200
 
 def handle_refund_event(db, event, event_type):
@@ -84,22 +113,10 @@ def handle_refund_event(db, event, event_type):
         refund_amount = refund_entity.get("amount")
         
         if not payment_id:
-            print(f"No payment_id in refund webhook")
+            log.warning("No payment_id in refund webhook")
             return jsonify({"error": "missing_payment_id"}), 400
         
-        print(f"Processing refund event: {event_type} for payment {payment_id}")
-        
-        # Find order by payment_id
-        order = db.orders.find_one({
-            "$or": [
-                {"payment_id": payment_id},
-                {"razorpay_payment_id": payment_id}
-            ]
-        })
-        
-        if not order:
-            print(f"Order not found for payment_id: {payment_id}")
-            return jsonify({"error": "order_not_found"}), 404
+        log.info("Processing refund event: %s for payment %s", event_type, payment_id)
         
         now = datetime.utcnow()
         
@@ -138,34 +155,85 @@ def handle_refund_event(db, event, event_type):
 
         update_data["$push"] = {"statusHistory": status_entry}
 
-        # Update order in database
-        result = db.orders.update_one(
-            {"_id": order["_id"]},
-            update_data
+        # Find the order by payment_id and update it in one round-trip; the
+        # update does not depend on the current document, and the $push
+        # always modifies it
+        order = db.orders.find_one_and_update(
+            {
+                "$or": [
+                    {"payment_id": payment_id},
+                    {"razorpay_payment_id": payment_id}
+                ]
+            },
+            update_data,
+            return_document=ReturnDocument.AFTER
         )
 
-        if result.modified_count > 0:
-            print(f"Order {order.get('orderId')} updated with refund status: {refund_status}")
+        if not order:
+            log.warning("Order not found for payment_id: %s", payment_id)
+            return jsonify({"error": "order_not_found"}), 404
 
-            # Send notification for refund processed
-            if event_type == "refund.processed":
-                from app.services.notification_service import send_order_status_notification
-                updated_order = db.orders.find_one({"_id": order["_id"]})
-                send_order_status_notification(updated_order, "refunded")
+        log.info("Order %s updated with refund status: %s", order.get("orderId"), refund_status)
 
-            return jsonify({
-                "status": "success",
-                "order_id": order.get("orderId"),
-                "refund_status": refund_status
-            }), 200
-        else:
-            print(f"Order {order.get('orderId')} not modified (possibly same data)")
-            return jsonify({"status": "no_change"}), 200
+        # Send notification for refund processed
+        if event_type == "refund.processed":
+            from app.services.notification_service import send_order_status_notification
+            background.submit(send_order_status_notification, order, "refunded")
+
+        return jsonify({
+            "status": "success",
+            "order_id": order.get("orderId"),
+            "refund_status": refund_status
+        }), 200
             
     except Exception as e:
-        print(f"Error processing refund webhook: {e}")
+        log.exception("Error processing refund webhook: %s", e)
         return jsonify({"error": "processing_error", "message": str(e)}), 500
 
+def _send_whatsapp_confirmation(order):
+    """Send the WhatsApp order confirmation for a captured payment."""
+    try:
+        whatsapp = get_whatsapp_service()
+
+        # Extract customer details
+        customer = order.get('customer', {})
+        name = customer.get('name', 'Customer')
+        phone = customer.get('phone', '')
+
+        # Extract order items
+        items = order.get('items', [])
+        formatted_items = []
+        for item in items:
+            formatted_items.append({
+                'name': item.get('name', 'Item'),
+                'price': float(item.get('price', 0)),
+                'quantity': int(item.get('quantity', 1))
+            })
+
+        # Get order total
+        total = float(order.get('totalAmount', order.get('amount', 0)))
+        order_id = order.get('orderId', str(order.get('_id', '')))
+
+        if phone and formatted_items:
+            wa_result = whatsapp.send_order_confirmation(
+                name=name,
+                phone=phone,
+                order_id=order_id,
+                items=formatted_items,
+                total=total
+            )
+
+            if wa_result.get('success'):
+                log.info("WhatsApp order confirmation sent for %s to %s", order_id, phone)
+            else:
+                log.warning("WhatsApp failed for %s: %s", order_id, wa_result.get("message"))
+        else:
+            log.warning("Cannot send WhatsApp for %s: phone=%s, items=%d", order_id, phone, len(formatted_items))
+
+    except Exception as wa_error:
+        # Log error but don't fail order processing
+        log.error("WhatsApp error for %s: %s", order.get("orderId"), wa_error)
+
 def handle_payment_event(db, event, event_type):
     """Handle payment-related webhook events"""
     try:
@@ -177,10 +245,10 @@ def handle_payment_event(db, event, event_type):
         payment_status = payment_entity.get("status")
         
         if not payment_id:
-            print(f"No payment_id in payment webhook")
+            log.warning("No payment_id in payment webhook")
             return jsonify({"error": "missing_payment_id"}), 400
         
-        print(f"Processing payment event: {event_type} for payment {payment_id}")
+        log.info("Processing payment event: %s for payment %s", event_type, payment_id)
         
         # Find order by payment_id
         order = db.orders.find_one({
@@ -191,7 +259,7 @@ def handle_payment_event(db, event, event_type):
         })
         
         if not order:
-            print(f"Order not found for payment_id: {payment_id}")
+            log.warning("Order not found for payment_id: %s", payment_id)
             return jsonify({"error": "order_not_found"}), 404
         
         now = datetime.utcnow()
@@ -219,64 +287,25 @@ def handle_payment_event(db, event, event_type):
         
         update_data["$push"] = {"statusHistory": status_entry}
         
-        # Update order
-        result = db.orders.update_one(
+        # Update order and get the updated document back from the write
+        updated_order = db.orders.find_one_and_update(
             {"_id": order["_id"]},
-            update_data
+            update_data,
+            return_document=ReturnDocument.AFTER
         )
 
-        if result.modified_count > 0:
-            print(f"Order {order.get('orderId')} updated with payment status: {payment_status}")
+        if updated_order is not None:
+            log.info("Order %s updated with payment status: %s", order.get("orderId"), payment_status)
 
-            # Send in-app notification for payment captured
+            # Notifications run in the background so Razorpay gets its 200
+            # after the Mongo write alone, without waiting on outbound calls
             if event_type == "payment.captured":
                 from app.services.notification_service import send_order_status_notification
-                updated_order = db.orders.find_one({"_id": order["_id"]})
-                send_order_status_notification(updated_order, "paid")
+                background.submit(send_order_status_notification, updated_order, "paid")
 
             # Send WhatsApp notification for captured payments
             if event_type == "payment.captured" and payment_status == "captured":
-                try:
-                    whatsapp = get_whatsapp_service()
-
-                    # Extract customer details
-                    customer = order.get('customer', {})
-                    name = customer.get('name', 'Customer')
-                    phone = customer.get('phone', '')
-
-                    # Extract order items
-                    items = order.get('items', [])
-                    formatted_items = []
-                    for item in items:
-                        formatted_items.append({
-                            'name': item.get('name', 'Item'),
-                            'price': float(item.get('price', 0)),
-                            'quantity': int(item.get('quantity', 1))
-                        })
-
-                    # Get order total
-                    total = float(order.get('totalAmount', order.get('amount', 0)))
-                    order_id = order.get('orderId', str(order.get('_id', '')))
-
-                    if phone and formatted_items:
-                        wa_result = whatsapp.send_order_confirmation(
-                            name=name,
-                            phone=phone,
-                            order_id=order_id,
-                            items=formatted_items,
-                            total=total
-                        )
-
-                        if wa_result.get('success'):
-                            print(f"✅ WhatsApp order confirmation sent for {order_id} to {phone}")
-                        else:
-                            print(f"⚠️ WhatsApp failed for {order_id}: {wa_result.get('message')}")
-                    else:
-                        print(f"⚠️ Cannot send WhatsApp for {order_id}: phone={phone}, items={len(formatted_items)}")
-
-                except Exception as wa_error:
-                    # Log error but don't fail order processing
-                    print(f"❌ WhatsApp error for {order.get('orderId')}: {str(wa_error)}")
+                background.submit(_send_whatsapp_confirmation, order)
 
             return jsonify({
                 "status": "success",
@@ -287,5 +316,5 @@ def handle_payment_event(db, event, event_type):
             return jsonify({"status": "no_change"}), 200
             
     except Exception as e:
-        print(f"Error processing payment webhook: {e}")
+        log.exception("Error processing payment webhook: %s", e)
         return jsonify({"error": "processing_error", "message": str(e)}), 500
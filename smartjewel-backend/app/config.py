@@ -1,34 +1,90 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-load_dotenv()
+
+
+@lru_cache(maxsize=1)
+def _load_env():
+    """Parse .env into the process environment once and snapshot the result."""
+    load_dotenv()
+    return dict(os.environ)
+
+
+_ENV = _load_env()
+
+_DEFAULT_CORS_ORIGINS = "http://localhost:3000,http://127.0.0.1:3000,http://localhost:5173,http://127.0.0.1:5173"
+
+
+# Parsers for list/flag settings, cached on the raw string so Config
+# subclasses and repeated lookups share one parse per value
+@lru_cache(maxsize=None)
+def _parse_csv(raw, lower=False):
+    items = (item.strip() for item in raw.split(","))
+    return tuple(item.lower() if lower else item for item in items if item)
+
+
+@lru_cache(maxsize=None)
+def _parse_bool(raw):
+    return raw.lower() in ("1", "true", "yes", "on")
+
 
 class Config:
-    APP_ENV = os.getenv("APP_ENV", "development")
-    MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-    MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "smartjewel")
-    JWT_SECRET = os.getenv("JWT_SECRET", "your-super-secret-jwt-key-change-this-in-production")
-    JWT_ACCESS_TTL_MIN = int(os.getenv("JWT_ACCESS_TTL_MIN", "60"))
-    JWT_REFRESH_TTL_DAYS = int(os.getenv("JWT_REFRESH_TTL_DAYS", "7"))
-    CORS_ORIGINS = [o.strip() for o in (os.getenv("CORS_ORIGINS") or "http://localhost:3000,http://127.0.0.1:3000,http://localhost:5173,http://127.0.0.1:5173").split(",")]
-    RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "100 per hour")
-    ADMIN_EMAILS = [e.strip().lower() for e in (os.getenv("ADMIN_EMAILS") or "admin@smartjewel.com").split(",") if e.strip()]
-    GOLDAPI_KEY = os.getenv("GOLDAPI_KEY", "your-gold-api-key-here")
+    APP_ENV = _ENV.get("APP_ENV", "development")
+    LOG_LEVEL = _ENV.get("LOG_LEVEL", "INFO").upper()
+    # Fraction of successful, fast requests written to the access log
+    # (errors and requests slower than REQUEST_LOG_SLOW_MS always are)
+    REQUEST_LOG_SAMPLE_RATE = float(_ENV.get("REQUEST_LOG_SAMPLE_RATE", "0.01"))
+    REQUEST_LOG_SLOW_MS = int(_ENV.get("REQUEST_LOG_SLOW_MS", "1000"))
+    MONGODB_URI = _ENV.get("MONGODB_URI", "mongodb://localhost:27017")
+    MONGO_DB_NAME = _ENV.get("MONGO_DB_NAME", "smartjewel")
+    # MongoClient connection pool (one client per process, shared by all requests)
+    MONGO_MAX_POOL_SIZE = int(_ENV.get("MONGO_MAX_POOL_SIZE", "50"))
+    MONGO_MIN_POOL_SIZE = int(_ENV.get("MONGO_MIN_POOL_SIZE", "5"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(_ENV.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+    MONGO_MAX_IDLE_TIME_MS = int(_ENV.get("MONGO_MAX_IDLE_TIME_MS", "60000"))
+    JWT_SECRET = _ENV.get("JWT_SECRET", "your-super-secret-jwt-key-change-this-in-production")
+    JWT_ACCESS_TTL_MIN = int(_ENV.get("JWT_ACCESS_TTL_MIN", "60"))
+    JWT_REFRESH_TTL_DAYS = int(_ENV.get("JWT_REFRESH_TTL_DAYS", "7"))
+    CORS_ORIGINS = list(_parse_csv(_ENV.get("CORS_ORIGINS") or _DEFAULT_CORS_ORIGINS))
+    RATE_LIMIT_DEFAULT = _ENV.get("RATE_LIMIT_DEFAULT", "100 per hour")
+    ADMIN_EMAILS = list(_parse_csv(_ENV.get("ADMIN_EMAILS") or "admin@smartjewel.com", lower=True))
+    GOLDAPI_KEY = _ENV.get("GOLDAPI_KEY", "your-gold-api-key-here")
+    # Blueprint modules create_app should not register (comma-separated, e.g. app.blueprints.analytics)
+    DISABLED_BLUEPRINTS = list(_parse_csv(_ENV.get("DISABLED_BLUEPRINTS") or ""))
     # Enable/disable APScheduler background jobs
-    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+    SCHEDULER_ENABLED = _parse_bool(_ENV.get("SCHEDULER_ENABLED", "true"))
 
     # SMTP configuration for email sending
-    SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
-    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-    SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
-    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
-    SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes", "on")
-    SMTP_FROM = os.getenv("SMTP_FROM", os.getenv("SMTP_USERNAME", "no-reply@smartjewel.local"))
+    SMTP_HOST = _ENV.get("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT = int(_ENV.get("SMTP_PORT", "587"))
+    SMTP_USERNAME = _ENV.get("SMTP_USERNAME", "")
+    SMTP_PASSWORD = _ENV.get("SMTP_PASSWORD", "")
+    SMTP_USE_TLS = _parse_bool(_ENV.get("SMTP_USE_TLS", "true"))
+    SMTP_FROM = _ENV.get("SMTP_FROM", _ENV.get("SMTP_USERNAME", "no-reply@smartjewel.local"))
 
     # OTP configuration
-    OTP_LENGTH = int(os.getenv("OTP_LENGTH", "6"))
-    OTP_TTL_MINUTES = int(os.getenv("OTP_TTL_MINUTES", "10"))
-    OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+    OTP_LENGTH = int(_ENV.get("OTP_LENGTH", "6"))
+    OTP_TTL_MINUTES = int(_ENV.get("OTP_TTL_MINUTES", "10"))
+    OTP_MAX_ATTEMPTS = int(_ENV.get("OTP_MAX_ATTEMPTS", "5"))
     
     # ML service configuration
-    ML_FORECAST_URL = os.getenv("ML_FORECAST_URL", None)
+    ML_FORECAST_URL = _ENV.get("ML_FORECAST_URL", None)
+
+    # Razorpay webhook signing secret; verification is skipped when unset (development)
+    RAZORPAY_WEBHOOK_SECRET = _ENV.get("RAZORPAY_WEBHOOK_SECRET", "")
+
+    @classmethod
+    def get(cls, key, default=None):
+        """Read a setting from the startup environment snapshot."""
+        return _ENV.get(key, default)
+
+    @classmethod
+    def validate(cls):
+        """Return a list of configuration problems worth reporting at startup."""
+        problems = []
+        if not cls.RAZORPAY_WEBHOOK_SECRET:
+            problems.append("RAZORPAY_WEBHOOK_SECRET not configured; webhook signatures will not be verified")
+        if cls.APP_ENV == "production" and cls.JWT_SECRET == "your-super-secret-jwt-key-change-this-in-production":
+            problems.append("JWT_SECRET is the default placeholder")
+        return problems
 
@@ -1,72 +1,169 @@
+import logging
+import os
+import threading
 from datetime import timedelta
+from functools import lru_cache
+from urllib.parse import urlparse
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from pymongo import MongoClient
+from pymongo import MongoClient, uri_parser
+import orjson
 import structlog
 
 jwt = JWTManager()
 cors = CORS()
 limiter = Limiter(key_func=get_remote_address)
-log = structlog.get_logger()
-mongo_client = None
+# Lazy proxy: the app context is attached here, but the logger itself is
+# assembled on first use (after init_extensions configures structlog) and
+# then cached, so no processor chain is rebuilt per call
+log = structlog.get_logger("smartjewel", app="smartjewel")
 db = None
 
+
+class _ClientHolder:
+    """Process-local MongoClient, created on first use in each process.
+
+    A client inherited across fork() shares sockets and monitor threads with
+    the parent, so when the pid changes (gunicorn workers, reloader) the next
+    access builds a fresh client instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self._settings = None
+
+    def configure(self, uri, **options):
+        with self._lock:
+            self._settings = (uri, options)
+            self._client = None
+
+    def get(self):
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                uri, options = self._settings
+                self._client = MongoClient(uri, **options)
+                self._pid = os.getpid()
+            return self._client
+
+
+_client_holder = _ClientHolder()
+
+
+class _LazyDatabase:
+    """Stands in for the pymongo Database in app.extensions['mongo_db'].
+
+    Attribute and item access resolve against the current process's client,
+    so handlers keep using ``db.orders`` / ``db["orders"]`` unchanged.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def _db(self):
+        return _client_holder.get()[self._name]
+
+    def __getattr__(self, attr):
+        return getattr(self._db(), attr)
+
+    def __getitem__(self, key):
+        return self._db()[key]
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return f"_LazyDatabase({self._name!r})"
+
+_LOOPBACK_SWAP = {"localhost": "127.0.0.1", "127.0.0.1": "localhost"}
+
+
+@lru_cache(maxsize=8)
+def _expand_origins(origins):
+    """Add the localhost/127.0.0.1 counterpart of each loopback origin to avoid dev mismatches."""
+    expanded = set(origins)
+    for origin in origins:
+        try:
+            p = urlparse(origin)
+        except ValueError:
+            continue
+        twin = _LOOPBACK_SWAP.get(p.hostname) if p.scheme and p.netloc else None
+        if twin:
+            try:
+                port = f":{p.port}" if p.port else ""
+            except ValueError:
+                continue
+            expanded.add(f"{p.scheme}://{twin}{port}")
+    return frozenset(expanded)
+
+
 def init_extensions(app):
-    global mongo_client, db
-    # Use shorter client timeouts so API doesn't hang when DB is down
+    global db
+    cfg = app.config
+    # Use shorter client timeouts so API doesn't hang when DB is down.
+    # One client per process is shared by every request, which borrows a
+    # pooled connection from it; waitQueueTimeoutMS bounds how long a worker
+    # blocks when the pool is exhausted instead of hanging indefinitely.
+    # connect=False defers the first connection (and its monitor threads) to
+    # the first operation, so cold starts don't pay the handshake up front.
     try:
-        mongo_client = MongoClient(
-            app.config["MONGODB_URI"],
+        # Validate the URI without building a client; the client itself is
+        # created on first access in whichever process (worker) uses it
+        uri_parser.parse_uri(cfg["MONGODB_URI"])
+        _client_holder.configure(
+            cfg["MONGODB_URI"],
             serverSelectionTimeoutMS=3000,
             connectTimeoutMS=3000,
             socketTimeoutMS=3000,
+            maxPoolSize=cfg.get("MONGO_MAX_POOL_SIZE", 50),
+            minPoolSize=cfg.get("MONGO_MIN_POOL_SIZE", 5),
+            waitQueueTimeoutMS=cfg.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000),
+            maxIdleTimeMS=cfg.get("MONGO_MAX_IDLE_TIME_MS", 60000),
+            retryWrites=True,
+            connect=False,
         )
-        db = mongo_client[app.config["MONGO_DB_NAME"]]
+        db = _LazyDatabase(cfg["MONGO_DB_NAME"])
         app.extensions['mongo_db'] = db
-        print(f"MongoDB connected successfully to {app.config['MONGO_DB_NAME']}")
+        print(f"MongoDB client configured for {cfg['MONGO_DB_NAME']}")
     except Exception as e:
         print(f"MongoDB connection failed: {e}")
         print("Continuing without database - orders will not be persisted")
         db = None
         app.extensions['mongo_db'] = None
 
-    # Expand CORS origins to include localhost/127.0.0.1 counterparts to avoid dev mismatches
-    cfg_origins = app.config["CORS_ORIGINS"] or []
-    expanded = set(cfg_origins)
-    for origin in list(cfg_origins):
-        try:
-            from urllib.parse import urlparse
-            p = urlparse(origin)
-            if p.scheme and p.netloc:
-                host = p.hostname
-                port = f":{p.port}" if p.port else ""
-                if host == "localhost":
-                    expanded.add(f"{p.scheme}://127.0.0.1{port}")
-                if host == "127.0.0.1":
-                    expanded.add(f"{p.scheme}://localhost{port}")
-        except Exception:
-            pass
-
     cors.init_app(app,
                   supports_credentials=True,
-                  origins=list(expanded),
+                  origins=list(_expand_origins(tuple(cfg["CORS_ORIGINS"] or ()))),
                   allow_headers=["Content-Type", "Authorization"],
                   methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+    # JWT settings go in before init_app so the extension sees them up front
+    cfg["JWT_SECRET_KEY"] = cfg["JWT_SECRET"]
+    cfg["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=cfg["JWT_ACCESS_TTL_MIN"])
+    cfg["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=cfg["JWT_REFRESH_TTL_DAYS"])
     jwt.init_app(app)
     # Apply default rate limit if provided
-    default_limit = app.config.get("RATE_LIMIT_DEFAULT")
+    default_limit = cfg.get("RATE_LIMIT_DEFAULT")
     if default_limit:
-        app.config.setdefault("RATELIMIT_DEFAULT", default_limit)
+        cfg.setdefault("RATELIMIT_DEFAULT", default_limit)
     limiter.init_app(app)
 
-    app.config["JWT_SECRET_KEY"] = app.config["JWT_SECRET"]
-    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=app.config["JWT_ACCESS_TTL_MIN"])
-    app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=app.config["JWT_REFRESH_TTL_DAYS"])
-
-    # Ensure global db is updated for all imports
-    import app.extensions as _ext
-    _ext.db = db
-
-    structlog.configure(processors=[structlog.processors.JSONRenderer()])
\ No newline at end of file
+    # orjson renders straight to bytes, so log through the bytes logger;
+    # below-level calls are dropped by the filtering wrapper before any
+    # processor runs, and the assembled logger is cached on first use
+    level = logging.getLevelName(cfg.get("LOG_LEVEL", "INFO"))
+    structlog.configure(
+        processors=[
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
+            structlog.processors.JSONRenderer(serializer=orjson.dumps),
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(level if isinstance(level, int) else logging.INFO),
+        logger_factory=structlog.BytesLoggerFactory(),
+        cache_logger_on_first_use=True,
+    )
\ No newline at end of file
@@ -1,62 +1,156 @@
+import importlib
+import os
 import time
+import random
 import logging
-import json
-from bson import ObjectId
-from flask import Flask, jsonify, request, send_from_directory
+import orjson
+from flask import Flask, g, jsonify, request, send_from_directory
 from app.config import Config
 from flask.json.provider import DefaultJSONProvider
 from app.extensions import init_extensions, log
-from app.blueprints.core.routes import bp as core_bp
-from app.blueprints.auth.routes import bp as auth_bp
-from app.blueprints.staff import bp as staff_bp
-from app.blueprints.customers.routes import bp as customers_bp
-from app.blueprints.inventory.routes import bp as inventory_bp
-from app.blueprints.payments import bp as payments_bp
-from app.blueprints.market import bp as market_bp
-from app.blueprints.catalog.routes import bp as catalog_bp
-from app.blueprints.orders.routes import bp as orders_bp
-from app.blueprints.admin_orders.routes import bp as admin_orders_bp
-from app.blueprints.webhooks.razorpay_webhook import bp as webhooks_bp
-from app.blueprints.store import bp as store_bp
-from app.blueprints.store_manager.routes import bp as store_manager_bp
-from app.blueprints.rentals.routes import bp as rentals_bp
-
-# ---- GLOBAL ObjectId JSON PATCH ----
-def default_json(obj):
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
-json._default_encoder = json.JSONEncoder(default=default_json)
+from app.utils.json_encoding import ORJSON_OPTIONS, default_json
+
+def _response_obj(args, kwargs):
+    """The value jsonify(*args, **kwargs) serializes, per Flask's documented rules."""
+    if args and kwargs:
+        raise TypeError("jsonify() behavior undefined when passed both args and kwargs")
+    if not args:
+        return kwargs
+    return args[0] if len(args) == 1 else args
 
 class MongoJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes ObjectId as its hex string.
+
+    jsonify() encodes through orjson straight to the response bytes; it
+    handles datetimes natively (as ISO 8601, naive values tagged UTC).
+    Anything orjson still rejects (e.g. oversized ints) falls back to the
+    stdlib encoder.
+    """
+    @staticmethod
+    def default(obj):
+        # Same encodings as the orjson path first, then Flask's (dates, UUIDs,
+        # dataclasses) for anything only the stdlib fallback reaches
+        try:
+            return default_json(obj)
+        except TypeError:
+            return DefaultJSONProvider.default(obj)
+
     def dumps(self, obj, **kwargs):
-        kwargs.setdefault('default', default_json)
-        return json.dumps(obj, **kwargs)
+        option = ORJSON_OPTIONS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default_json, option=option).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round trip of the base implementation
+        obj = _response_obj(args, kwargs)
+        option = ORJSON_OPTIONS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        try:
+            body = orjson.dumps(obj, default=default_json, option=option)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
     def loads(self, s, **kwargs):
-        return json.loads(s, **kwargs)
+        # request.get_json() parses through here; orjson is several times
+        # faster than the stdlib for typical request bodies
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+# CORS plus no-cache (to ensure fresh images) for files under /static/
+_STATIC_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0',
+}
+
+# (module, attribute) of every blueprint create_app registers, in order.
+# Modules listed in DISABLED_BLUEPRINTS are skipped without being imported
+_BLUEPRINTS = (
+    ("app.blueprints.core.routes", "bp"),
+    ("app.blueprints.auth.routes", "bp"),
+    ("app.blueprints.staff", "bp"),
+    ("app.blueprints.customers.routes", "bp"),
+    ("app.blueprints.inventory.routes", "bp"),
+    ("app.blueprints.payments", "bp"),  # demo/test
+    ("app.blueprints.market", "bp"),  # gold rate
+    ("app.blueprints.catalog.routes", "bp"),  # advanced search & suggestions
+    ("app.blueprints.orders.routes", "bp"),  # customer-facing
+    ("app.blueprints.admin_orders.routes", "bp"),
+    ("app.blueprints.webhooks.razorpay_webhook", "bp"),
+    ("app.blueprints.store", "bp"),
+    ("app.blueprints.store_manager.routes", "bp"),
+    ("app.blueprints.notifications.routes", "bp"),
+    ("app.blueprints.alerts.routes", "bp"),
+    ("app.blueprints.rentals.routes", "bp"),
+    ("app.blueprints.rentals.booking_routes", "bp_bookings"),
+    ("app.blueprints.analytics", "bp"),
+    ("app.blueprints.customer_kyc", "bp"),
+    ("app.blueprints.admin_kyc", "bp"),
+)
+
+_log_listener = None
+_UPLOAD_DIR_READY = False
+
+def _configure_logging(level):
+    """Send the app's stdlib logs through a queue to a background writer.
+
+    Request threads only enqueue records; formatting and the blocking
+    stream write happen on the QueueListener thread. Idempotent, so
+    repeated create_app() calls don't stack handlers.
+    """
+    global _log_listener
+    pkg_logger = logging.getLogger("app")
+    pkg_logger.setLevel(level)
+    if _log_listener is not None:
+        return
+    import atexit
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(name)s: %(message)s"))
+    _log_listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    pkg_logger.addHandler(QueueHandler(log_queue))
 
 def create_app():
-    import os
-    from flask import jsonify as flask_jsonify
-    import flask
     app = Flask(__name__, static_folder='static')
-    app.json_provider_class = MongoJSONProvider
-    # Still set legacy encoder for very old extensions, if any
-    try:
-        app.json_encoder = MongoJSONProvider
-    except Exception:
-        pass
+    # Match "/x" and "/x/" to the same rule instead of answering with a 308
+    # redirect; a redirect costs the client a second round trip and breaks
+    # CORS preflights (e.g. the frontend calls /api/notifications/)
+    app.url_map.strict_slashes = False
+    # The provider instance is created in Flask.__init__, so replace it directly
+    app.json = MongoJSONProvider(app)
     app.config.from_object(Config)
-    # Ensure INFO-level logs (so scheduler startup and job registration are visible)
+    # Configure before first use of app.logger so Flask doesn't attach its
+    # own synchronous stderr handler. LOG_LEVEL defaults to INFO (so
+    # scheduler startup and job registration are visible)
+    log_level = app.config.get("LOG_LEVEL", "INFO")
     try:
-        app.logger.setLevel(logging.INFO)
-        logging.getLogger('werkzeug').setLevel(logging.INFO)
+        _configure_logging(log_level)
+        app.logger.setLevel(log_level)
+        logging.getLogger('werkzeug').setLevel(log_level)
     except Exception:
         pass
     
-    # Ensure static/uploads directory exists (for local development)
-    upload_dir = os.path.join(app.root_path, 'static', 'uploads')
-    os.makedirs(upload_dir, exist_ok=True)
+    # Ensure static/uploads directory exists (for local development). Once
+    # per process, and not at all on Vercel's read-only filesystem
+    global _UPLOAD_DIR_READY
+    if not _UPLOAD_DIR_READY and not Config.get("VERCEL"):
+        upload_dir = os.path.join(app.root_path, 'static', 'uploads')
+        os.makedirs(upload_dir, exist_ok=True)
+        _UPLOAD_DIR_READY = True
     
     # Initialize Cloudinary for image uploads
     try:
@@ -68,13 +162,15 @@ def create_app():
     except Exception as e:
         app.logger.warning(f"Cloudinary initialization failed: {e}")
     
+    for problem in Config.validate():
+        app.logger.warning("Config: %s", problem)
+
     init_extensions(app)
 
     # Optionally start background scheduler for gold rate refresh (reloader-safe)
     try:
         from app.scheduler import setup_scheduler
         from app.config import Config as _Cfg
-        import os
         should_start = True
         # In debug with reloader, only start in the main process
         if app.debug:
@@ -88,28 +184,16 @@ def create_app():
     except Exception as _e:
         app.logger.error(f"Failed to start scheduler: {_e}")
 
-    app.register_blueprint(core_bp)
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(staff_bp)
-    app.register_blueprint(customers_bp)
-
-    # Inventory blueprint
-    from app.blueprints.inventory.routes import bp as inventory_bp
-    app.register_blueprint(inventory_bp)
-
-    # Payments blueprint (demo/test)
-    from app.blueprints.payments import bp as payments_bp
-    app.register_blueprint(payments_bp)
-
-    # Market data (gold rate) blueprint
-    from app.blueprints.market import bp as market_bp
-    app.register_blueprint(market_bp)
+    # Blueprints are imported here rather than at module level so importing
+    # app.init (or app) doesn't pull in every route module and its
+    # dependencies before create_app() runs
+    disabled = set(app.config.get("DISABLED_BLUEPRINTS") or ())
+    for module_name, attr in _BLUEPRINTS:
+        if module_name in disabled:
+            app.logger.info("Blueprint %s disabled by config", module_name)
+            continue
+        app.register_blueprint(getattr(importlib.import_module(module_name), attr))
 
-    # Catalog (advanced search & suggestions) blueprint
-    from app.blueprints.catalog.routes import bp as catalog_bp
-    app.register_blueprint(catalog_bp)
-    
-    
     # Virtual Try-On blueprint (only if ML dependencies are available)
     try:
         from app.blueprints.catalog import virtual_tryon_bp, VIRTUAL_TRYON_AVAILABLE
@@ -121,74 +205,17 @@ def create_app():
     except (ImportError, AttributeError) as e:
         app.logger.warning(f"Virtual try-on feature disabled: {e}")
 
-
-    # Orders API (customer-facing)
-    from app.blueprints.orders.routes import bp as orders_bp
-    app.register_blueprint(orders_bp)
-
-    # Admin Orders API
-    from app.blueprints.admin_orders.routes import bp as admin_orders_bp
-    app.register_blueprint(admin_orders_bp)
-
-    # Webhooks (Razorpay, etc.)
-    from app.blueprints.webhooks.razorpay_webhook import bp as webhooks_bp
-    app.register_blueprint(webhooks_bp)
-
-    # Store blueprint
-    from app.blueprints.store import bp as store_bp
-    app.register_blueprint(store_bp)
-
-    # Store Manager blueprint
-    from app.blueprints.store_manager.routes import bp as store_manager_bp
-    app.register_blueprint(store_manager_bp)
-
-    # Notifications blueprint
-    from app.blueprints.notifications.routes import bp as notifications_bp
-    app.register_blueprint(notifications_bp)
-
-    # Alerts blueprint
-    from app.blueprints.alerts.routes import bp as alerts_bp
-    app.register_blueprint(alerts_bp)
-
-    # Rentals blueprint
-    from app.blueprints.rentals.routes import bp as rentals_bp
-    app.register_blueprint(rentals_bp)
-    
-    # Rental Bookings blueprint
-    from app.blueprints.rentals.booking_routes import bp_bookings as rental_bookings_bp
-    app.register_blueprint(rental_bookings_bp)
-    
-    # Analytics blueprint
-    from app.blueprints.analytics import bp as analytics_bp
-    app.register_blueprint(analytics_bp)
-    
-    # Customer KYC blueprint
-    from app.blueprints.customer_kyc import bp as customer_kyc_bp
-    app.register_blueprint(customer_kyc_bp)
-    
-    # Admin KYC blueprint  
-    from app.blueprints.admin_kyc import bp as admin_kyc_bp
-    app.register_blueprint(admin_kyc_bp)
-
     # Explicit static file serving route with CORS and cache control headers
     @app.route('/static/<path:filename>')
     def serve_static(filename):
-        import os
-        from flask import make_response
-        
         if app.static_folder is None:
             return jsonify({"error": "static_folder_not_configured"}), 500
             
         try:
+            # send_from_directory streams the file (direct_passthrough);
+            # only the headers are touched here
             response = send_from_directory(app.static_folder, filename)
-            # Add CORS headers
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-            # Disable caching for now to ensure fresh images
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
+            response.headers.update(_STATIC_HEADERS)
             return response
         except Exception as e:
             app.logger.error(f"Error serving static file {filename}: {str(e)}")
@@ -196,12 +223,9 @@ def create_app():
 
     @app.route("/")
     def index():
-        # List all routes for debugging
-        output = []
-        for rule in app.url_map.iter_rules():
-            methods = ','.join(sorted((rule.methods or set()).difference({"HEAD", "OPTIONS"})))
-            output.append(f"{methods} {rule}")
-        return {"routes": output}
+        # List all routes for debugging; the map is fixed once create_app
+        # returns, so the body is rendered there
+        return app.response_class(app.config["_ROUTES_JSON"], mimetype="application/json")
 
     @app.errorhandler(404)
     def not_found(e):
@@ -211,21 +235,44 @@ def create_app():
     def rate_limit(e):
         return jsonify({"error": "rate_limited"}), 429
 
+    # Successful requests are sampled; errors and slow requests always log
+    sample_rate = app.config.get("REQUEST_LOG_SAMPLE_RATE", 1.0)
+    slow_ms = app.config.get("REQUEST_LOG_SLOW_MS", 1000)
+
     @app.before_request
     def _start_timer():
-        request._start = time.time()  # type: ignore
+        g.request_start_ns = time.perf_counter_ns()
 
     @app.after_request
     def _log_request(response):
-        latency = round((time.time() - getattr(request, "_start", time.time())) * 1000, 2)
+        # No start time means the timer never ran (a before_request hook
+        # short-circuited first), so there is no latency to report
+        start = g.get("request_start_ns")
+        if start is None:
+            return response
+        path = request.path
+        # Catalog images dominate request volume; keep them out of the log
+        if path.startswith("/static/"):
+            return response
+        status = response.status_code
+        # Microsecond resolution without float rounding on the hot path
+        latency = (time.perf_counter_ns() - start) // 1000 / 1000
+        if status < 400 and latency < slow_ms and random.random() >= sample_rate:
+            return response
         log.info(
             "request",
             method=request.method,
-            path=request.path,
-            status=response.status_code,
+            path=path,
+            status=status,
             latency_ms=latency,
             ip=request.remote_addr,
         )
         return response
 
+    output = []
+    for rule in app.url_map.iter_rules():
+        methods = ','.join(sorted((rule.methods or set()).difference({"HEAD", "OPTIONS"})))
+        output.append(f"{methods} {rule}")
+    app.config["_ROUTES_JSON"] = app.json.dumps({"routes": output})
+
     return app
\ No newline at end of file
@@ -1,34 +1,102 @@
-from datetime import datetime
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
 from typing import Any
+from zoneinfo import ZoneInfo
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-import pytz
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
 
 from app.services.gold_rate_service import GoldRateService
 
 
-IST = pytz.timezone("Asia/Kolkata")
+IST = ZoneInfo("Asia/Kolkata")
 
+# Every worker process runs its own scheduler; a scheduled refresh only goes
+# ahead in the process that claims this lock, the rest skip that run
+_GOLD_RATE_LOCK = "gold_rate_refresh"
+_GOLD_RATE_LOCK_TTL = timedelta(minutes=30)
+# Spread the 09:00/18:00 refreshes over a couple of minutes so restarts and
+# replicas don't all call GoldAPI in the same second
+_GOLD_RATE_JITTER_SECONDS = 120
 
-def _job(app) -> None:
-    """Scheduled job to refresh gold rates and reprice products."""
+# Back-in-stock alerts come from a products change stream where the deployment
+# supports one (replica sets); polling then drops to a slow safety sweep
+_STOCK_POLL_MINUTES = 30
+_STOCK_SWEEP_MINUTES = 6 * 60
+_STOCK_CHANGE_PIPELINE = [
+    {"$match": {"operationType": "update", "updateDescription.updatedFields.quantity": {"$gt": 0}}},
+    {"$project": {"documentKey": 1}},
+]
+# Every worker sees each event; this lock lets one of them handle it
+_STOCK_EVENT_LOCK_TTL = timedelta(minutes=1)
+# Reconnect backoff after the stream fails (doubles up to the max)
+_STREAM_RETRY_MIN_SECONDS = 5
+_STREAM_RETRY_MAX_SECONDS = 300
+# "$changeStream is only supported on replica sets"
+_CHANGE_STREAM_UNSUPPORTED = 40573
+# Resume token no longer usable (ChangeStreamFatalError, ChangeStreamHistoryLost)
+_RESUME_TOKEN_LOST = (280, 286)
+_LOCK_HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+_LOCK_INDEX_READY = False
+
+
+def _acquire_job_lock(db, name: str, ttl: timedelta) -> bool:
+    """Claim the scheduler_locks entry ``name`` for ``ttl``; False if another process holds it.
+
+    The filter only matches an expired lock, so while it is held the upsert
+    tries to insert a second document with the same _id and fails.
+    """
+    global _LOCK_INDEX_READY
+    if not _LOCK_INDEX_READY:
+        try:
+            # Expired locks are removed by Mongo; expiry is still checked here
+            db.scheduler_locks.create_index("expires_at", name="expires_at_ttl", expireAfterSeconds=0)
+            _LOCK_INDEX_READY = True
+        except Exception:
+            pass
+    now = datetime.utcnow()
+    try:
+        result = db.scheduler_locks.update_one(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"expires_at": now + ttl, "holder": _LOCK_HOLDER, "acquired_at": now}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return bool(result.upserted_id or result.modified_count == 1)
+
+
+def _started_extra() -> dict:
+    """Job start time, read once and attached to both the started and completed logs."""
+    current_time = datetime.now(IST)
+    return {
+        "now_ist": current_time.isoformat(),
+        "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S IST"),
+    }
+
+
+def _job(app, lock: bool = True) -> None:
+    """Scheduled job to refresh gold rates and reprice products.
+
+    With ``lock`` (scheduled runs) only one process per window does the work.
+    """
     with app.app_context():  # CRITICAL: App context needed for database access
         try:
             # Log job start with explicit IST timestamp for verification
-            current_time = datetime.now(IST)
-            app.logger.info(
-                "gold_rate_refresh_job_started",
-                extra={
-                    "now_ist": current_time.isoformat(),
-                    "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S IST"),
-                },
-            )
+            started = _started_extra()
+            app.logger.info("gold_rate_refresh_job_started", extra=started)
             db = app.extensions.get('mongo_db')
             if db is None:
                 app.logger.error("Scheduler: DB not available, skipping gold rate refresh")
                 return
+            if lock and not _acquire_job_lock(db, _GOLD_RATE_LOCK, _GOLD_RATE_LOCK_TTL):
+                app.logger.info("gold_rate_refresh_job_skipped", extra={"reason": "lock_held", **started})
+                return
 
             app.logger.info("gold_rate_refresh_job_fetching_rates")
             result = GoldRateService.refresh_and_reprice(db)
@@ -45,6 +113,7 @@ def _job(app) -> None:
                     "error_count": result.get("price_update", {}).get("error_count"),
                     "skipped_count": result.get("price_update", {}).get("skipped_count"),
                     "rates_24k": result.get("rates", {}).get("24k"),
+                    **started,
                 },
             )
         except Exception as e:
@@ -56,18 +125,15 @@ def _check_price_drops_job(app) -> None:
     try:
         from app.services.alert_service import AlertService
         
-        current_time = datetime.now(IST)
-        app.logger.info(
-            "price_drop_check_job_started",
-            extra={"timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S IST")}
-        )
+        started = _started_extra()
+        app.logger.info("price_drop_check_job_started", extra=started)
         
         with app.app_context():
             triggered_count = AlertService.check_price_drops()
             
         app.logger.info(
             "price_drop_check_job_completed",
-            extra={"triggered_alerts": triggered_count}
+            extra={"triggered_alerts": triggered_count, **started}
         )
     except Exception as e:
         app.logger.exception(f"Price drop check job failed: {e}")
@@ -78,23 +144,79 @@ def _check_stock_changes_job(app) -> None:
     try:
         from app.services.alert_service import AlertService
         
-        current_time = datetime.now(IST)
-        app.logger.info(
-            "stock_check_job_started",
-            extra={"timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S IST")}
-        )
+        started = _started_extra()
+        app.logger.info("stock_check_job_started", extra=started)
         
         with app.app_context():
             triggered_count = AlertService.check_stock_changes()
             
         app.logger.info(
             "stock_check_job_completed",
-            extra={"triggered_alerts": triggered_count}
+            extra={"triggered_alerts": triggered_count, **started}
         )
     except Exception as e:
         app.logger.exception(f"Stock check job failed: {e}")
 
 
+def _set_stock_check_interval(app, scheduler, minutes: int) -> None:
+    try:
+        scheduler.reschedule_job("stock_change_check", trigger=IntervalTrigger(minutes=minutes, timezone=IST))
+        app.logger.info("stock_check_job_rescheduled", extra={"interval_minutes": minutes})
+    except Exception as e:
+        app.logger.warning(f"Failed to reschedule stock check job: {e}")
+
+
+def _watch_stock_changes(app, scheduler) -> None:
+    """Trigger back-in-stock alerts as products are restocked (runs on its own thread).
+
+    Exits, leaving the polling job in charge, when change streams are
+    unsupported (standalone mongod). Any other failure, including Mongo being
+    unreachable at startup, puts polling back to its normal interval and
+    reconnects with backoff, resuming after the last handled event.
+    """
+    from app.services.alert_service import AlertService
+
+    with app.app_context():
+        db = app.extensions.get('mongo_db')
+        if db is None:
+            return
+        resume_token = None
+        delay = _STREAM_RETRY_MIN_SECONDS
+        sweeping = False
+        while True:
+            try:
+                with db.products.watch(_STOCK_CHANGE_PIPELINE, resume_after=resume_token) as stream:
+                    if not sweeping:
+                        _set_stock_check_interval(app, scheduler, _STOCK_SWEEP_MINUTES)
+                        sweeping = True
+                    delay = _STREAM_RETRY_MIN_SECONDS
+                    for change in stream:
+                        product_id = change["documentKey"]["_id"]
+                        if _acquire_job_lock(db, f"stock_change:{product_id}", _STOCK_EVENT_LOCK_TTL):
+                            try:
+                                AlertService.check_stock_changes([product_id])
+                            except Exception as e:
+                                app.logger.exception(f"Stock change alert failed for {product_id}: {e}")
+                        resume_token = stream.resume_token
+            except OperationFailure as e:
+                if e.code == _CHANGE_STREAM_UNSUPPORTED:
+                    app.logger.info("stock_change_stream_unavailable", extra={"error": str(e)})
+                    break
+                if e.code in _RESUME_TOKEN_LOST:
+                    # Restart from now; the polling sweep covers the gap
+                    resume_token = None
+                app.logger.warning(f"Stock change stream failed, retrying in {delay}s: {e}")
+            except PyMongoError as e:
+                app.logger.warning(f"Stock change stream failed, retrying in {delay}s: {e}")
+            except Exception as e:
+                app.logger.exception(f"Stock change stream stopped, retrying in {delay}s: {e}")
+            if sweeping:
+                _set_stock_check_interval(app, scheduler, _STOCK_POLL_MINUTES)
+                sweeping = False
+            time.sleep(delay)
+            delay = min(delay * 2, _STREAM_RETRY_MAX_SECONDS)
+
+
 def trigger_gold_rate_refresh(app: Any) -> dict:
     """Manually trigger the gold rate refresh job for testing."""
     try:
@@ -105,7 +227,7 @@ def trigger_gold_rate_refresh(app: Any) -> dict:
             return {"success": False, "error": "Database not available"}
 
         app.logger.info("Manual gold rate refresh triggered - starting job")
-        _job(app)
+        _job(app, lock=False)
         app.logger.info("Manual gold rate refresh job completed")
         return {"success": True, "message": "Gold rate refresh job triggered manually"}
     except Exception as e:
@@ -116,12 +238,13 @@ def trigger_gold_rate_refresh(app: Any) -> dict:
 def setup_scheduler(app: Any) -> BackgroundScheduler:
     """Initialize and start the background scheduler with IST cron times.
 
-    Runs every day at 09:00 and 18:00 IST to respect API limits.
+    Runs every day at 09:00 and 18:00 IST (plus up to two minutes of jitter)
+    to respect API limits.
     """
     scheduler = BackgroundScheduler(timezone=IST)
 
-    morning_trigger = CronTrigger(hour=9, minute=0, timezone=IST)
-    evening_trigger = CronTrigger(hour=18, minute=0, timezone=IST)
+    morning_trigger = CronTrigger(hour=9, minute=0, jitter=_GOLD_RATE_JITTER_SECONDS, timezone=IST)
+    evening_trigger = CronTrigger(hour=18, minute=0, jitter=_GOLD_RATE_JITTER_SECONDS, timezone=IST)
 
     scheduler.add_job(
         _job,
@@ -157,8 +280,8 @@ def setup_scheduler(app: Any) -> BackgroundScheduler:
         max_instances=1,
     )
 
-    # Stock check job - every 30 minutes
-    stock_check_trigger = IntervalTrigger(minutes=30, timezone=IST)
+    # Stock check job - every 30 minutes (every 6 hours while the change stream runs)
+    stock_check_trigger = IntervalTrigger(minutes=_STOCK_POLL_MINUTES, timezone=IST)
     scheduler.add_job(
         _check_stock_changes_job,
         stock_check_trigger,
@@ -171,6 +294,9 @@ def setup_scheduler(app: Any) -> BackgroundScheduler:
     )
 
     scheduler.start()
+    threading.Thread(
+        target=_watch_stock_changes, args=(app, scheduler), name="stock-change-stream", daemon=True
+    ).start()
     app.logger.info("APScheduler started with gold rate (9am/6pm), price checks (every 6h), and stock checks (every 30min)")
     # Log scheduled jobs and next run times for verification
     try:
@@ -180,8 +306,9 @@ def setup_scheduler(app: Any) -> BackgroundScheduler:
                 "scheduler_job_registered",
                 extra={
                     "job_id": job.id,
-                    "next_run_time": str(job.next_run_time),
+                    "next_run_time": str(job.next_run_time),  # jitter already applied
                     "trigger": str(job.trigger),
+                    "jitter": getattr(job.trigger, "jitter", None),
                     "timezone": str(IST),
                 },
             )
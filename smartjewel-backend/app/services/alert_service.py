@@ -1,8 +1,141 @@
+from concurrent.futures import wait
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.write_concern import WriteConcern
 from flask import current_app
 
+from app.utils import background
+
+
+# Rows per insert_many when snapshotting product prices
+_PRICE_HISTORY_BATCH_SIZE = 1000
+# How long price change rows are kept
+_PRICE_HISTORY_TTL_DAYS = 365
+# Price history is loss-tolerant: a snapshot lost in a crash is simply
+# recorded again on the next run, since its product's last price won't match.
+# Alerts and notifications keep the default write concern.
+_PRICE_HISTORY_WRITE_CONCERN = WriteConcern(w=0)
+# How long a check run waits for its alert emails (SMTP sends run in parallel
+# on the shared background pool)
+_EMAIL_WAIT_SECONDS = 120
+
+# Fields the alert checks and their notifications/emails read
+_CHECK_ALERT_FIELDS = {'product_id': 1, 'user_id': 1, 'target_price': 1, 'notification_methods': 1}
+_ALERT_PRODUCT_FIELDS = {'name': 1, 'price': 1, 'image': 1, 'quantity': 1}
+_ALERT_USER_FIELDS = {'name': 1, 'email': 1}
+
+# A price drop alert without a target fires on a drop of at least either
+_DROP_MIN_AMOUNT = 1000
+_DROP_MIN_FRACTION = 0.05
+_DROP_AMOUNT = {'$subtract': ['$old_price', '$product.price']}
+
+# Active price drop alerts joined to their product and last recorded price,
+# keeping only the ones that should fire: at or below the target price when
+# one is set, otherwise a drop of >5% or >₹1000 from the last recorded price
+_PRICE_DROP_PIPELINE = [
+    {'$match': {'alert_type': 'price_drop', 'is_active': True}},
+    {'$project': _CHECK_ALERT_FIELDS},
+    {'$lookup': {
+        'from': 'products',
+        'localField': 'product_id',
+        'foreignField': '_id',
+        'as': 'product',
+    }},
+    {'$unwind': '$product'},
+    {'$lookup': {
+        'from': 'price_history',
+        'let': {'product_id': '$product_id'},
+        'pipeline': [
+            {'$match': {'$expr': {'$eq': ['$product_id', '$$product_id']}}},
+            {'$sort': {'recorded_at': -1}},
+            {'$limit': 1},
+            {'$project': {'_id': 0, 'price': 1}},
+        ],
+        'as': 'last_price',
+    }},
+    {'$set': {'old_price': {'$arrayElemAt': ['$last_price.price', 0]}}},
+    {'$match': {'$expr': {'$and': [
+        '$product.price',
+        {'$or': [
+            {'$and': ['$target_price', {'$lte': ['$product.price', '$target_price']}]},
+            {'$and': [
+                {'$not': ['$target_price']},
+                '$old_price',
+                {'$or': [
+                    {'$gte': [_DROP_AMOUNT, _DROP_MIN_AMOUNT]},
+                    {'$gte': [_DROP_AMOUNT, {'$multiply': ['$old_price', _DROP_MIN_FRACTION]}]},
+                ]},
+            ]},
+        ]},
+    ]}}},
+    {'$project': {
+        **_CHECK_ALERT_FIELDS,
+        'old_price': 1,
+        'product._id': 1,  # not kept automatically for an embedded document
+        **{f'product.{field}': 1 for field in _ALERT_PRODUCT_FIELDS},
+    }},
+]
+
+
+def _ensure_indexes(db):
+    """Create indexes for alert checks and listings. Safe to call repeatedly."""
+    try:
+        # Scheduled checks: all active alerts of one type
+        db.alerts.create_index([('alert_type', 1), ('is_active', 1)], name='alert_type_is_active')
+    except Exception:
+        pass
+    try:
+        # get_user_alerts: a user's (active) alerts, newest first
+        db.alerts.create_index(
+            [('user_id', 1), ('is_active', 1), ('created_at', -1)],
+            name='user_is_active_created_at_desc'
+        )
+    except Exception:
+        pass
+    try:
+        # Stock change stream: the active alerts for one restocked product
+        db.alerts.create_index(
+            [('product_id', 1), ('alert_type', 1), ('is_active', 1)],
+            name='product_id_alert_type_is_active'
+        )
+    except Exception:
+        pass
+    try:
+        # Latest price per product: equality on product_id, newest first
+        db.price_history.create_index(
+            [('product_id', 1), ('recorded_at', -1)],
+            name='product_id_recorded_at_desc'
+        )
+    except Exception:
+        pass
+    try:
+        # Expire old change rows; a product whose last row expires is simply
+        # recorded again on the next run
+        db.price_history.create_index(
+            [('recorded_at', 1)],
+            name='recorded_at_ttl',
+            expireAfterSeconds=_PRICE_HISTORY_TTL_DAYS * 86400
+        )
+    except Exception:
+        pass
+
+
+_INDEXES_READY = False
+
+
+def _ensure_indexes_once(db):
+    global _INDEXES_READY
+    if _INDEXES_READY:
+        return
+    try:
+        _ensure_indexes(db)
+        _INDEXES_READY = True
+    except Exception:
+        # Ignore index failures; the next check run can retry
+        pass
+
 
 class AlertService:
     """Service to manage user alerts for price drops, stock changes, and gold rates."""
@@ -51,11 +184,11 @@ class AlertService:
                 alert['threshold_drop'] = params.get('threshold_drop', 50)  # ₹50/gram default
                 
             result = db.alerts.insert_one(alert)
-            print(f"[AlertService] Created {alert_type} alert {result.inserted_id} for user {user_id}")
+            current_app.logger.info("[AlertService] Created %s alert %s for user %s", alert_type, result.inserted_id, user_id)
             return str(result.inserted_id)
             
-        except Exception as e:
-            print(f"[AlertService] Failed to create alert: {e}")
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to create alert", exc_info=True)
             return None
     
     @staticmethod
@@ -70,12 +203,24 @@ class AlertService:
             if active_only:
                 query['is_active'] = True
                 
+            _ensure_indexes_once(db)
             alerts = list(db.alerts.find(query).sort('created_at', -1))
             
-            # Enrich with product info for product alerts
+            # Enrich with product info for product alerts, fetched in one query
+            product_ids = list({alert['product_id'] for alert in alerts if alert.get('product_id')})
+            products = {}
+            if product_ids:
+                products = {
+                    p['_id']: p
+                    for p in db.products.find(
+                        {'_id': {'$in': product_ids}},
+                        {'name': 1, 'price': 1, 'image': 1, 'sku': 1}
+                    )
+                }
+            
             for alert in alerts:
                 if alert.get('product_id'):
-                    product = db.products.find_one({'_id': alert['product_id']})
+                    product = products.get(alert['product_id'])
                     if product:
                         alert['product'] = {
                             '_id': str(product['_id']),
@@ -92,8 +237,8 @@ class AlertService:
                     
             return alerts
             
-        except Exception as e:
-            print(f"[AlertService] Failed to get user alerts: {e}")
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to get user alerts", exc_info=True)
             return []
     
     @staticmethod
@@ -109,8 +254,8 @@ class AlertService:
                 {'$set': {'is_active': False}}
             )
             return result.modified_count > 0
-        except Exception as e:
-            print(f"[AlertService] Failed to deactivate alert: {e}")
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to deactivate alert", exc_info=True)
             return False
     
     @staticmethod
@@ -126,8 +271,8 @@ class AlertService:
                 'user_id': ObjectId(user_id)
             })
             return result.deleted_count > 0
-        except Exception as e:
-            print(f"[AlertService] Failed to delete alert: {e}")
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to delete alert", exc_info=True)
             return False
     
     @staticmethod
@@ -146,71 +291,44 @@ class AlertService:
         triggered_count = 0
         
         try:
-            # Get all active price drop alerts
-            alerts = list(db.alerts.find({
-                'alert_type': 'price_drop',
-                'is_active': True
-            }))
+            # Only the alerts that should fire come back from the server
+            _ensure_indexes_once(db)
+            firing = list(db.alerts.aggregate(_PRICE_DROP_PIPELINE))
             
-            print(f"[AlertService] Checking {len(alerts)} price drop alerts")
+            current_app.logger.info("[AlertService] %d price drop alerts to trigger", len(firing))
+            notification_ops, alert_ops, pending_emails = [], [], []
+            # One timestamp for the whole run's notifications and triggered_at
+            now = datetime.utcnow()
             
-            for alert in alerts:
-                try:
-                    product_id = alert['product_id']
-                    product = db.products.find_one({'_id': product_id})
-                    
-                    if not product:
-                        continue
-                    
-                    current_price = product.get('price')
-                    if not current_price:
-                        continue
-                    
-                    # Check if we have price history
-                    last_price = db.price_history.find_one(
-                        {'product_id': product_id},
-                        sort=[('recorded_at', -1)]
-                    )
-                    
-                    should_notify = False
-                    
-                    # If target price is set, check if current price is below it
-                    if alert.get('target_price'):
-                        if current_price <= alert['target_price']:
-                            should_notify = True
-                    # Otherwise, check for significant drop from last recorded price
-                    elif last_price:
-                        old_price = last_price.get('price')
-                        if old_price:
-                            drop_amount = old_price - current_price
-                            drop_percentage = (drop_amount / old_price) * 100
-                            
-                            # Notify if price dropped >5% OR >₹1000
-                            if drop_percentage >= 5 or drop_amount >= 1000:
-                                should_notify = True
-                    
-                    if should_notify:
-                        AlertService._trigger_price_drop_alert(alert, product, last_price)
-                        triggered_count += 1
-                        
-                except Exception as e:
-                    print(f"[AlertService] Error processing alert {alert.get('_id')}: {e}")
+            users = AlertService._by_id(db.users, {a['user_id'] for a in firing}, _ALERT_USER_FIELDS)
+            
+            for alert in firing:
+                writes = AlertService._trigger_price_drop_alert(alert, alert['product'], users.get(alert['user_id']),
+                                                                alert.get('old_price'), now, pending_emails)
+                if writes:
+                    notification_ops.append(writes[0])
+                    alert_ops.append(writes[1])
+                triggered_count += 1
+            
+            AlertService._flush_triggered(db, notification_ops, alert_ops)
+            AlertService._wait_for_emails(pending_emails)
             
             # Record current prices
             AlertService._record_price_history()
             
-            print(f"[AlertService] Triggered {triggered_count} price drop alerts")
+            current_app.logger.info("[AlertService] Triggered %d price drop alerts", triggered_count)
             return triggered_count
             
-        except Exception as e:
-            print(f"[AlertService] Failed to check price drops: {e}")
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to check price drops", exc_info=True)
             return 0
     
     @staticmethod
-    def check_stock_changes() -> int:
+    def check_stock_changes(product_ids: Optional[List] = None) -> int:
         """
         Check for stock changes and trigger back-in-stock alerts.
-        Called by scheduled job every 30 minutes.
+        Called by the scheduled polling job, and with ``product_ids`` by the
+        products change stream for just the products that were restocked.
         
         Returns:
             Number of alerts triggered
@@ -222,18 +340,29 @@ class AlertService:
         triggered_count = 0
         
         try:
-            # Get all active back-in-stock alerts
-            alerts = list(db.alerts.find({
+            # Get all active back-in-stock alerts (for the given products)
+            _ensure_indexes_once(db)
+            query = {
                 'alert_type': 'back_in_stock',
                 'is_active': True
-            }))
+            }
+            if product_ids is not None:
+                query['product_id'] = {'$in': list(product_ids)}
+            alerts = list(db.alerts.find(query, _CHECK_ALERT_FIELDS))
             
-            print(f"[AlertService] Checking {len(alerts)} stock alerts")
+            current_app.logger.info("[AlertService] Checking %d stock alerts", len(alerts))
+            notification_ops, alert_ops, pending_emails = [], [], []
+            # One timestamp for the whole run's notifications and triggered_at
+            now = datetime.utcnow()
+            
+            # Load every referenced product and user up front
+            products = AlertService._by_id(db.products, {a['product_id'] for a in alerts if a.get('product_id')}, _ALERT_PRODUCT_FIELDS)
+            users = AlertService._by_id(db.users, {a['user_id'] for a in alerts}, _ALERT_USER_FIELDS)
             
             for alert in alerts:
                 try:
                     product_id = alert['product_id']
-                    product = db.products.find_one({'_id': product_id})
+                    product = products.get(product_id)
                     
                     if not product:
                         continue
@@ -242,17 +371,23 @@ class AlertService:
                     
                     # If product is now in stock, trigger alert
                     if quantity > 0:
-                        AlertService._trigger_stock_alert(alert, product)
+                        writes = AlertService._trigger_stock_alert(alert, product, users.get(alert['user_id']), now, pending_emails)
+                        if writes:
+                            notification_ops.append(writes[0])
+                            alert_ops.append(writes[1])
                         triggered_count += 1
                         
-                except Exception as e:
-                    print(f"[AlertService] Error processing stock alert {alert.get('_id')}: {e}")
+                except Exception:
+                    current_app.logger.error("[AlertService] Error processing stock alert %s", alert.get('_id'), exc_info=True)
+            
+            AlertService._flush_triggered(db, notification_ops, alert_ops)
+            AlertService._wait_for_emails(pending_emails)
             
-            print(f"[AlertService] Triggered {triggered_count} stock alerts")
+            current_app.logger.info("[AlertService] Triggered %d stock alerts", triggered_count)
             return triggered_count
             
-        except Exception as e:
-            print(f"[AlertService] Failed to check stock changes: {e}")
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to check stock changes", exc_info=True)
             return 0
     
     @staticmethod
@@ -263,43 +398,128 @@ class AlertService:
             return
             
         try:
-            products = db.products.find({'price': {'$exists': True, '$ne': None}})
-            
+            products = db.products.find(
+                {'price': {'$exists': True, '$ne': None}},
+                {'_id': 1, 'price': 1}
+            )
+            # Only changes are recorded, so the latest row per product is its
+            # price as of the last change; the drop check compares against it
+            last_prices = AlertService._last_prices(db)
+            
+            # One timestamp per run; rows go out in batches rather than
+            # one round-trip per product
+            now = datetime.utcnow()
+            history = db.get_collection('price_history', write_concern=_PRICE_HISTORY_WRITE_CONCERN)
+            batch = []
+            recorded = 0
             for product in products:
-                db.price_history.insert_one({
+                if last_prices.get(product['_id']) == product['price']:
+                    continue
+                batch.append({
                     'product_id': product['_id'],
                     'price': product['price'],
-                    'recorded_at': datetime.utcnow()
+                    'recorded_at': now
                 })
-            
-            print(f"[AlertService] Recorded price history")
-            
-        except Exception as e:
-            print(f"[AlertService] Failed to record price history: {e}")
+                if len(batch) >= _PRICE_HISTORY_BATCH_SIZE:
+                    history.insert_many(batch, ordered=False)
+                    recorded += len(batch)
+                    batch = []
+            if batch:
+                history.insert_many(batch, ordered=False)
+                recorded += len(batch)
+            
+            current_app.logger.info("[AlertService] Sent price changes for %d products (unacknowledged)", recorded)
+            
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to record price history", exc_info=True)
     
     @staticmethod
-    def _trigger_price_drop_alert(alert: Dict, product: Dict, last_price: Optional[Dict]):
-        """Send price drop notification and mark alert as triggered."""
-        from app.services.notification_service import send_order_status_notification
-        from app.utils.email_templates import price_drop_email
+    def _last_prices(db, product_ids: Optional[List] = None) -> Dict:
+        """Most recent recorded price per product (all products when ids is None), from one aggregation.
+
+        The $sort matches product_id_recorded_at_desc, so each group's
+        $first is read off the index rather than a blocking sort.
+        """
+        if product_ids is not None and not product_ids:
+            return {}
+        _ensure_indexes_once(db)
+        pipeline = [
+            {'$sort': {'product_id': 1, 'recorded_at': -1}},
+            {'$group': {'_id': '$product_id', 'price': {'$first': '$price'}}},
+        ]
+        if product_ids is not None:
+            pipeline.insert(0, {'$match': {'product_id': {'$in': product_ids}}})
+        return {doc['_id']: doc['price'] for doc in db.price_history.aggregate(pipeline, allowDiskUse=True)}
+    
+    @staticmethod
+    def _by_id(collection, ids, projection: Dict) -> Dict:
+        """Load documents for ``ids`` with one $in query, keyed by _id."""
+        if not ids:
+            return {}
+        return {doc['_id']: doc for doc in collection.find({'_id': {'$in': list(ids)}}, projection)}
+    
+    @staticmethod
+    def _send_alert_email(to_email: str, subject: str, text: str, html: str) -> bool:
+        """Runs on the background pool; failures are logged there."""
         from app.utils.mailer import send_email
-        
-        db = current_app.extensions.get('mongo_db')
-        if not db:
+        send_email(to_email, subject, text, html)
+        current_app.logger.debug("[AlertService] Sent alert email to %s", to_email)
+        return True
+    
+    @staticmethod
+    def _wait_for_emails(pending_emails: List):
+        """Wait (bounded) for the run's queued emails and report how many went out."""
+        if not pending_emails:
             return
+        done, not_done = wait(pending_emails, timeout=_EMAIL_WAIT_SECONDS)
+        sent = sum(1 for f in done if f.result() is True)
+        current_app.logger.info("[AlertService] Sent %d/%d alert emails (%d still pending)",
+                                sent, len(pending_emails), len(not_done))
+    
+    @staticmethod
+    def _flush_triggered(db, notification_ops: List, alert_ops: List):
+        """Write the notifications and alert deactivations collected by a check run."""
+        if notification_ops:
+            db.notifications.bulk_write(notification_ops, ordered=False)
+        if alert_ops:
+            db.alerts.bulk_write(alert_ops, ordered=False)
+    
+    @staticmethod
+    def _triggered_alert_op(alert: Dict, now: datetime) -> UpdateOne:
+        """Mark alert as triggered and deactivate (one-time alert)."""
+        return UpdateOne(
+            {'_id': alert['_id']},
+            {
+                '$set': {
+                    'is_active': False,
+                    'triggered_at': now
+                }
+            }
+        )
+    
+    @staticmethod
+    def _trigger_price_drop_alert(alert: Dict, product: Dict, user: Optional[Dict], old_price: Optional[float],
+                                  now: datetime, pending_emails: List):
+        """Queue the price drop email and return the (notification, alert update) writes.
+
+        The email goes to the background pool and its future is appended to
+        pending_emails. ``now`` is the check run's timestamp, shared by every
+        alert it triggers. Returns None when nothing should be written (e.g. the
+        user no longer exists). The caller batches the writes for the whole
+        run into one bulk_write per collection.
+        """
+        from app.utils.email_templates import price_drop_email
+        
+        if not user:
+            return None
             
         try:
-            user = db.users.find_one({'_id': alert['user_id']})
-            if not user:
-                return
-            
-            old_price = last_price.get('price') if last_price else None
             new_price = product.get('price')
             savings = old_price - new_price if old_price else 0
             percentage = (savings / old_price * 100) if old_price and old_price > 0 else 0
             
-            # Create in-app notification
-            db.notifications.insert_one({
+            # In-app notification
+            notification = InsertOne({
                 'user_id': alert['user_id'],
                 'title': f"Price Drop: {product.get('name')}",
                 'message': f"Great news! {product.get('name')} is now ₹{new_price:,.0f}" + 
@@ -312,7 +532,7 @@ class AlertService:
                     'savings': savings
                 },
                 'is_read': False,
-                'created_at': datetime.utcnow(),
+                'created_at': now,
                 'related_entity_id': str(product['_id']),
                 'related_entity_type': 'product'
             })
@@ -331,44 +551,31 @@ class AlertService:
                         f"{current_app.config.get('FRONTEND_URL', 'http://localhost:5173')}/product/{product['_id']}",
                         f"{current_app.config.get('FRONTEND_URL', 'http://localhost:5173')}/alerts/unsubscribe/{alert['_id']}"
                     )
-                    send_email(user['email'], subject, text, html)
-                    print(f"[AlertService] Sent price drop email to {user['email']}")
-                except Exception as e:
-                    print(f"[AlertService] Failed to send price drop email: {e}")
-            
-            # Mark alert as triggered and deactivate (one-time alert)
-            db.alerts.update_one(
-                {'_id': alert['_id']},
-                {
-                    '$set': {
-                        'is_active': False,
-                        'triggered_at': datetime.utcnow()
-                    }
-                }
-            )
+                    pending_emails.append(background.submit(AlertService._send_alert_email, user['email'], subject, text, html))
+                except Exception:
+                    current_app.logger.error("[AlertService] Failed to queue price drop email", exc_info=True)
             
-            print(f"[AlertService] Triggered price drop alert for user {alert['user_id']}, product {product.get('name')}")
+            current_app.logger.debug("[AlertService] Triggered price drop alert for user %s, product %s", alert['user_id'], product.get('name'))
+            return notification, AlertService._triggered_alert_op(alert, now)
             
-        except Exception as e:
-            print(f"[AlertService] Failed to trigger price drop alert: {e}")
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to trigger price drop alert", exc_info=True)
+            return None
     
     @staticmethod
-    def _trigger_stock_alert(alert: Dict, product: Dict):
-        """Send back-in-stock notification and mark alert as triggered."""
+    def _trigger_stock_alert(alert: Dict, product: Dict, user: Optional[Dict], now: datetime, pending_emails: List):
+        """Queue the back-in-stock email and return the (notification, alert update) writes.
+
+        Returns None when nothing should be written; see _trigger_price_drop_alert.
+        """
         from app.utils.email_templates import stock_available_email
-        from app.utils.mailer import send_email
         
-        db = current_app.extensions.get('mongo_db')
-        if not db:
-            return
+        if not user:
+            return None
             
         try:
-            user = db.users.find_one({'_id': alert['user_id']})
-            if not user:
-                return
-            
-            # Create in-app notification
-            db.notifications.insert_one({
+            # In-app notification
+            notification = InsertOne({
                 'user_id': alert['user_id'],
                 'title': f"Back in Stock: {product.get('name')}",
                 'message': f"{product.get('name')} is back in stock! Order now before it's gone.",
@@ -378,7 +585,7 @@ class AlertService:
                     'quantity': product.get('quantity')
                 },
                 'is_read': False,
-                'created_at': datetime.utcnow(),
+                'created_at': now,
                 'related_entity_id': str(product['_id']),
                 'related_entity_type': 'product'
             })
@@ -393,23 +600,13 @@ class AlertService:
                         product.get('price'),
                         f"{current_app.config.get('FRONTEND_URL', 'http://localhost:5173')}/product/{product['_id']}"
                     )
-                    send_email(user['email'], subject, text, html)
-                    print(f"[AlertService] Sent stock alert email to {user['email']}")
-                except Exception as e:
-                    print(f"[AlertService] Failed to send stock alert email: {e}")
-            
-            # Mark alert as triggered and deactivate
-            db.alerts.update_one(
-                {'_id': alert['_id']},
-                {
-                    '$set': {
-                        'is_active': False,
-                        'triggered_at': datetime.utcnow()
-                    }
-                }
-            )
+                    pending_emails.append(background.submit(AlertService._send_alert_email, user['email'], subject, text, html))
+                except Exception:
+                    current_app.logger.error("[AlertService] Failed to queue stock alert email", exc_info=True)
             
-            print(f"[AlertService] Triggered stock alert for user {alert['user_id']}, product {product.get('name')}")
+            current_app.logger.debug("[AlertService] Triggered stock alert for user %s, product %s", alert['user_id'], product.get('name'))
+            return notification, AlertService._triggered_alert_op(alert, now)
             
-        except Exception as e:
-            print(f"[AlertService] Failed to trigger stock alert: {e}")
+        except Exception:
+            current_app.logger.error("[AlertService] Failed to trigger stock alert", exc_info=True)
+            return None
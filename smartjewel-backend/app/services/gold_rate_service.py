@@ -1,4 +1,8 @@
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 import pytz
@@ -8,24 +12,90 @@ from app.services.price_calculator import GoldPriceCalculator
 
 IST = pytz.timezone("Asia/Kolkata")
 
+_GOLDAPI_URL = "https://www.goldapi.io/api/XAU/INR"
+
+# One keep-alive session for GoldAPI, with a short retry on throttling and
+# transient server errors; the static headers are set once
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=["GET"], raise_on_status=False),
+))
+_SESSION.headers.update({
+    "x-access-token": Config.GOLDAPI_KEY,
+    "Content-Type": "application/json",
+})
+
+# Last successful GoldAPI result, reused for this long so a manual refresh
+# right after a scheduled one (or a restart) doesn't spend another API call
+_GOLDAPI_CACHE_TTL_SECONDS = 1800
+_goldapi_cache = {}  # rates, fetched_at, expires_at (monotonic), etag
+_goldapi_cache_lock = threading.Lock()
+
+_GRAMS_PER_TROY_OUNCE = 31.1034768
+# Lower karats as a fraction of the 24k per-gram price
+_PURITY = (("22k", 22 / 24.0), ("18k", 18 / 24.0), ("14k", 14 / 24.0))
+
+
+def _remember(rates: Dict[str, float], fetched_at: datetime, etag: Optional[str] = None) -> Dict[str, Any]:
+    with _goldapi_cache_lock:
+        _goldapi_cache.update(
+            rates=rates,
+            fetched_at=fetched_at,
+            etag=etag,
+            expires_at=time.monotonic() + _GOLDAPI_CACHE_TTL_SECONDS,
+        )
+    return {"rates": rates, "fetched_at": fetched_at}
+
+
+def _age_seconds(updated_at: datetime) -> float:
+    # Mongo hands datetimes back naive in UTC
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - updated_at).total_seconds()
+
 
 class GoldRateService:
     """Service to fetch gold rates from GoldAPI, store them, and trigger price updates."""
 
     @staticmethod
-    def fetch_from_goldapi() -> Optional[Dict[str, Any]]:
+    def fetch_from_goldapi(db=None) -> Optional[Dict[str, Any]]:
+        """Return ``{"rates", "fetched_at"}`` for the current gold price.
+
+        A result younger than _GOLDAPI_CACHE_TTL_SECONDS is reused, from
+        memory or, after a restart, from the gold_rate document when ``db``
+        is given. Otherwise GoldAPI is called, conditionally if it sent an
+        ETag last time.
+        """
         api_key = Config.GOLDAPI_KEY
         if not api_key or api_key == "your-gold-api-key-here":
             # Log missing API key for visibility
             print("GoldRateService: GOLDAPI_KEY missing or default placeholder; skipping fetch")
             return None
-        url = "https://www.goldapi.io/api/XAU/INR"
-        headers = {
-            "x-access-token": api_key,
-            "Content-Type": "application/json",
-        }
+
+        with _goldapi_cache_lock:
+            cached = dict(_goldapi_cache)
+        if cached and cached["expires_at"] > time.monotonic():
+            return {"rates": cached["rates"], "fetched_at": cached["fetched_at"]}
+        if not cached and db is not None:
+            try:
+                doc = db.gold_rate.find_one({}, {"rates": 1, "updated_at": 1}) or {}
+                stored_at = doc.get("updated_at")
+                if doc.get("rates") and isinstance(stored_at, datetime) and _age_seconds(stored_at) < _GOLDAPI_CACHE_TTL_SECONDS:
+                    return _remember(doc["rates"], stored_at)
+            except Exception as e:
+                print(f"GoldRateService: could not read stored gold rate: {e}")
+
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
         try:
-            resp = requests.get(url, headers=headers, timeout=20)
+            resp = _SESSION.get(_GOLDAPI_URL, headers=headers, timeout=20)
+            if resp.status_code == 304 and cached:
+                # Unchanged upstream; the rates are current as of now
+                return _remember(cached["rates"], datetime.now(IST), cached.get("etag"))
             if resp.status_code >= 400:
                 try:
                     body = resp.text
@@ -44,36 +114,30 @@ class GoldRateService:
             if g24 is None:
                 try:
                     oz = float(data.get("price"))
-                    g24 = oz / 31.1034768
+                    g24 = oz / _GRAMS_PER_TROY_OUNCE
                 except Exception:
                     g24 = None
 
             if g24 is None:
                 return None
 
-            def k(val: int) -> float:
-                return round(g24 * (val / 24.0), 4)
-
-            rates = {
-                "24k": round(g24, 4),
-                "22k": k(22),
-                "18k": k(18),
-                "14k": k(14),
-            }
-            return {"rates": rates}
+            rates = {"24k": round(g24, 4), **{karat: round(g24 * factor, 4) for karat, factor in _PURITY}}
+            return _remember(rates, datetime.now(IST), resp.headers.get("ETag"))
         except Exception as e:
             print(f"GoldRateService: Exception calling GoldAPI: {e}")
             return None
 
     @staticmethod
     def persist_rates(db, rates_payload: Dict[str, Any]) -> Dict[str, Any]:
-        payload = {"updated_at": datetime.now(IST), "rates": rates_payload.get("rates", {})}
+        # updated_at is when the rates were fetched, so a cached result
+        # re-persisted later doesn't look fresher than it is
+        payload = {"updated_at": rates_payload.get("fetched_at") or datetime.now(IST), "rates": rates_payload.get("rates", {})}
         db.gold_rate.update_one({}, {"$set": payload}, upsert=True)
         return payload
 
     @staticmethod
     def refresh_and_reprice(db) -> Dict[str, Any]:
-        fetched = GoldRateService.fetch_from_goldapi()
+        fetched = GoldRateService.fetch_from_goldapi(db)
         if not fetched:
             return {"success": False, "error": "refresh_failed"}
 
@@ -5,6 +5,7 @@ Handles communication with the WhatsApp microservice
 
 import requests
 import os
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional, Any
 from flask import current_app
 
@@ -21,6 +22,12 @@ class WhatsAppService:
         """
         self.base_url = base_url
         self.timeout = 10  # seconds
+        # Keep-alive connections to the microservice are reused across
+        # messages instead of reconnecting on every send
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def is_ready(self) -> bool:
         """
@@ -30,7 +37,7 @@ class WhatsAppService:
             True if service is ready, False otherwise
         """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/health",
                 timeout=self.timeout
             )
@@ -56,7 +63,7 @@ class WhatsAppService:
             Dictionary with success status and message
         """
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/send/register",
                 json={
                     'name': name,
@@ -126,7 +133,7 @@ class WhatsAppService:
             Dictionary with success status and message
         """
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/send/order",
                 json={
                     'name': name,
@@ -16,12 +16,27 @@ def _has_any(claim_values: Iterable[str], required: Iterable[str]) -> bool:
     return False
 
 
+def _verify_jwt_once() -> None:
+    """Verify the request JWT unless an outer @jwt_required() already did.
+
+    Routes commonly stack @jwt_required() on top of these decorators; the
+    decoded claims are already on the request context then, so a second
+    signature check would be redundant.
+    """
+    try:
+        if get_jwt():
+            return
+    except RuntimeError:
+        pass
+    verify_jwt_in_request()
+
+
 def require_roles(*roles: str) -> Callable:
     """Require that ALL listed roles are present."""
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            verify_jwt_in_request()
+            _verify_jwt_once()
             claims = get_jwt()
             log.debug(f"require_roles: Required roles: {roles}, User roles: {claims.get('roles', [])}")
             if not all(r in claims.get("roles", []) for r in roles):
@@ -37,7 +52,7 @@ def require_any_role(*roles: str) -> Callable:
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            verify_jwt_in_request()
+            _verify_jwt_once()
             claims = get_jwt()
             log.debug(f"require_any_role: Required roles: {roles}, User roles: {claims.get('roles', [])}")
             if not _has_any(claims.get("roles", []), roles):
@@ -58,7 +73,7 @@ def require_permissions(*perms: str) -> Callable:
                 auth_header = request.headers.get('Authorization', 'NOT_PROVIDED')
                 log.debug(f"require_permissions: Authorization header: {auth_header[:20]}..." if auth_header != 'NOT_PROVIDED' else f"require_permissions: Authorization header: NOT_PROVIDED")
                 
-                verify_jwt_in_request()
+                _verify_jwt_once()
                 claims = get_jwt()
                 
                 # Log the claims for debugging
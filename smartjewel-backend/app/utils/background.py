@@ -0,0 +1,29 @@
+"""Fire-and-forget side effects (notifications, messaging) off the request path."""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from flask import current_app
+
+log = logging.getLogger(__name__)
+
+# Shared by every request in the process; side effects are I/O-bound
+# (HTTPS, SMTP, Mongo), so a handful of threads keeps up easily
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bg")
+
+
+def submit(fn, *args, **kwargs) -> Future:
+    """Run ``fn(*args, **kwargs)`` on the background pool inside an app context.
+
+    Call from within a request or app context. Exceptions are logged, not
+    raised, so a failed side effect never surfaces to the caller.
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                log.exception("Background task %s failed", getattr(fn, "__name__", fn))
+
+    return _executor.submit(run)
@@ -0,0 +1,28 @@
+"""The app's single orjson configuration.
+
+Shared by the Flask JSON provider (jsonify) and the streamed list responses
+so every endpoint encodes the same types the same way.
+"""
+from decimal import Decimal
+
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+
+# Exact-type dispatch for the values orjson hands back to default_json: one
+# dict lookup instead of an isinstance chain per value. Decimals become
+# strings, as Flask's stdlib provider already did for decimal.Decimal
+_DEFAULT_DISPATCH = {ObjectId: str, Decimal128: str, Decimal: str}
+
+# Naive datetimes from Mongo are UTC; int keys (e.g. grouped counts) and
+# numpy values from the ML paths encode without falling back
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def default_json(obj):
+    encode = _DEFAULT_DISPATCH.get(type(obj))
+    if encode is not None:
+        return encode(obj)
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,50 @@
+"""Streaming JSON responses for list endpoints backed by Mongo cursors."""
+import logging
+from typing import Any, Iterable
+
+import orjson
+from flask import Response
+
+from app.utils.json_encoding import ORJSON_OPTIONS, default_json
+
+log = logging.getLogger(__name__)
+
+_END = object()
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to JSON bytes with the same orjson settings as jsonify()."""
+    return orjson.dumps(obj, default=default_json, option=ORJSON_OPTIONS)
+
+
+def stream_list(key: str, items: Iterable[Any], **extra: Any) -> Response:
+    """Stream ``{key: [...items], **extra}`` without building the list first.
+
+    Each item is serialized as the cursor yields it, so peak memory stays at
+    one document regardless of how many rows the query returns.
+
+    The first item is pulled before returning, so a failing query raises in
+    the caller (and becomes an ordinary error response). An error after that,
+    once the 200 headers are out, is logged and the body is closed as valid
+    JSON with an ``"error"`` member in place of the extra members.
+    """
+    items = iter(items)
+    first = next(items, _END)
+
+    def generate():
+        yield b"{" + dumps(key) + b":["
+        if first is not _END:
+            yield dumps(first)
+            try:
+                for item in items:
+                    yield b"," + dumps(item)
+            except Exception:
+                log.exception("stream_list: %s stream interrupted", key)
+                yield b'],"error":"stream_interrupted"}'
+                return
+        yield b"]"
+        for name, value in extra.items():
+            yield b"," + dumps(name) + b":" + dumps(value)
+        yield b"}"
+
+    return Response(generate(), mimetype="application/json")
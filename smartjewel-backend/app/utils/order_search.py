@@ -0,0 +1,29 @@
+"""Customer search terms stored on orders for the store manager order search."""
+import re
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def customer_search_terms(customer) -> list:
+    """Lowercased terms an order's customer can be found by in list_store_orders.
+
+    The full name, each word of it, the email and the phone, so a prefix
+    search matches a surname as well as the start of the name. The phone is
+    also stored as bare digits, and without its country code, so a number
+    typed with or without spacing or +91 still prefix-matches.
+    """
+    customer = customer or {}
+    terms = []
+    name = str(customer.get("name") or "").strip().lower()
+    if name:
+        terms.append(name)
+        terms.extend(w for w in name.split() if w != name)
+    for field in ("email", "phone"):
+        value = str(customer.get(field) or "").strip().lower()
+        if value:
+            terms.append(value)
+    digits = _NON_DIGITS.sub("", str(customer.get("phone") or ""))
+    for term in (digits, digits[-10:]):
+        if term and term not in terms:
+            terms.append(term)
+    return terms
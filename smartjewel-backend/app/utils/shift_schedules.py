@@ -0,0 +1,32 @@
+"""Duplicate detection for staff shift schedules.
+
+Shared by the staff blueprint and scripts/backfill_shift_schedule_dedupe_key.py.
+"""
+import hashlib
+import json
+from typing import Any, Dict
+
+# Fields that identify a duplicate shift schedule (besides staff_id)
+SCHEDULE_KEY_FIELDS = ("recurrence", "start_time", "end_time", "timezone", "days",
+                       "effective_from", "effective_to", "store_id")
+
+
+def schedule_dedupe_key(doc: Dict[str, Any]) -> str:
+    """Content hash of the fields that make two shift schedules duplicates."""
+    key = {
+        "staff_id": doc["staff_id"],
+        "recurrence": doc["recurrence"],
+        "start_time": doc.get("start_time"),
+        "end_time": doc.get("end_time"),
+        "timezone": doc.get("timezone"),
+        "store_id": doc.get("store_id") or None,
+    }
+    if doc["recurrence"] == "weekly":
+        key["days"] = sorted(doc.get("days") or [])
+    else:
+        # One-time schedules compare on their date window
+        for field in ("effective_from", "effective_to"):
+            value = doc.get(field)
+            key[field] = value.isoformat() if hasattr(value, "isoformat") else value
+    raw = json.dumps(key, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
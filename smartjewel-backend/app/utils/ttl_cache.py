@@ -0,0 +1,47 @@
+"""Small thread-safe, per-process TTL cache for lookups on hot request paths."""
+import threading
+import time
+from typing import Any, Hashable
+
+# Returned by get() on a miss, so a cached None ("no value") is a hit
+MISSING = object()
+
+
+class TTLCache:
+    """Maps keys to values that expire ``ttl`` seconds after they are set.
+
+    When full, expired entries are dropped first, then the oldest entries,
+    so one burst of new keys never empties the whole cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = {}  # key -> (value, expires_at); insertion ordered
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)
+            if len(self._data) >= self.maxsize:
+                self._data = {k: v for k, v in self._data.items() if v[1] > now}
+                while len(self._data) >= self.maxsize:
+                    del self._data[next(iter(self._data))]
+            self._data[key] = (value, now + self.ttl)
+
+    def pop(self, key: Hashable) -> None:
+        """Evict ``key`` so the next lookup reads through."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,12 @@
+"""Per-process caches of user fields read on hot request paths.
+
+They live outside the blueprints that read them so code that changes a user
+(staff update_staff) can evict the entry instead of waiting out the TTL.
+Keys are user id strings as carried in the JWT identity.
+"""
+from app.utils.ttl_cache import TTLCache
+
+# user_id -> role name; rental admin checks run on every admin request
+USER_ROLE_NAMES = TTLCache(maxsize=1024, ttl=30)
+# user_id -> assigned store ObjectId; every store manager request resolves it
+USER_STORE_OIDS = TTLCache(maxsize=1024, ttl=120)
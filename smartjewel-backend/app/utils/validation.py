@@ -0,0 +1,23 @@
+"""Parsing helpers for values taken from request JSON."""
+import math
+
+
+def positive_float(value, label):
+    """Parse a strictly positive, finite amount from request JSON.
+
+    Returns (amount, None) on success or (None, error_message) on failure.
+    Numeric JSON values skip the float() parse and its exception path.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        amount = float(value)
+    else:
+        try:
+            amount = float(value)
+        except (TypeError, ValueError):
+            return None, f"Invalid {label.lower()} format"
+    # float() also accepts "inf" and "nan"
+    if not math.isfinite(amount):
+        return None, f"Invalid {label.lower()} format"
+    if not amount > 0:
+        return None, f"{label} must be greater than 0"
+    return amount, None
@@ -0,0 +1,42 @@
+"""
+Backfill users.full_name_lower for the staff directory search.
+
+list_staff matches an anchored prefix against full_name_lower so the query
+can use an index. Users created before that field existed (or through other
+code paths) need it populated once.
+"""
+
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "smartjewel")
+
+
+def backfill():
+    client = MongoClient(MONGODB_URI)
+    db = client[MONGO_DB_NAME]
+
+    ops = []
+    cursor = db.users.find({"full_name_lower": {"$exists": False}}, {"full_name": 1, "name": 1})
+    for user in cursor:
+        name = user.get("full_name") or user.get("name")
+        if name:
+            ops.append(UpdateOne({"_id": user["_id"]}, {"$set": {"full_name_lower": name.lower()}}))
+
+    if ops:
+        result = db.users.bulk_write(ops, ordered=False)
+        print(f"Updated {result.modified_count} users")
+    else:
+        print("Nothing to update")
+
+    db.users.create_index([("full_name_lower", 1)], name="full_name_lower")
+    client.close()
+
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,48 @@
+"""
+Backfill orders.createdAt as a real date on every order.
+
+The store manager order list sorts and filters on the stored `createdAt`
+field (backed by the store_createdAt_id_desc index) instead of computing a sort
+date per request. Older orders only have `created_at`, or a string
+`createdAt`; this copies/converts them, falling back to the _id timestamp.
+`created_at` is left in place for code that still reads it.
+"""
+
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "smartjewel")
+
+
+def _as_date(field):
+    return {"$convert": {"input": field, "to": "date", "onError": None, "onNull": None}}
+
+
+def backfill():
+    client = MongoClient(MONGODB_URI)
+    db = client[MONGO_DB_NAME]
+
+    # Same precedence the list endpoint used when it computed the sort date
+    result = db.orders.update_many(
+        {"createdAt": {"$not": {"$type": "date"}}},
+        [{"$set": {"createdAt": {"$ifNull": [
+            _as_date("$createdAt"),
+            {"$ifNull": [_as_date("$created_at"), {"$toDate": "$_id"}]},
+        ]}}}],
+    )
+    print(f"Updated {result.modified_count} orders")
+
+    db.orders.create_index(
+        [("store_id", 1), ("deleted", 1), ("createdAt", -1), ("_id", -1)],
+        name="store_createdAt_id_desc",
+    )
+    client.close()
+
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,74 @@
+"""
+Normalize orders for the store manager order filters.
+
+list_store_orders matches `status` by plain equality and searches customers
+by an anchored prefix on `customer_search`, so both can use an index. This
+lowercases any legacy mixed-case `status`, sets a missing `status` from the
+latest `statusHistory` entry, and fills `customer_search` for
+orders written before the field existed. Pass --rebuild to recompute the
+terms on every order after customer_search_terms changes.
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.order_search import customer_search_terms  # noqa: E402
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "smartjewel")
+
+
+def backfill(rebuild=False):
+    client = MongoClient(MONGODB_URI)
+    db = client[MONGO_DB_NAME]
+
+    result = db.orders.update_many(
+        {"status": {"$type": "string"}, "$expr": {"$ne": ["$status", {"$toLower": "$status"}]}},
+        [{"$set": {"status": {"$toLower": "$status"}}}],
+    )
+    print(f"Lowercased status on {result.modified_count} orders")
+
+    # The status filter matches the top-level field only; orders that never
+    # had one take the latest statusHistory entry
+    result = db.orders.update_many(
+        {"status": {"$exists": False}, "statusHistory.0": {"$exists": True}},
+        [{"$set": {"status": {"$toLower": {"$arrayElemAt": ["$statusHistory.status", -1]}}}}],
+    )
+    print(f"Set status from statusHistory on {result.modified_count} orders")
+
+    ops = []
+    missing = {} if rebuild else {"customer_search": {"$exists": False}}
+    for order in db.orders.find(missing, {"customer": 1}):
+        terms = customer_search_terms(order.get("customer"))
+        ops.append(UpdateOne({"_id": order["_id"]}, {"$set": {"customer_search": terms}}))
+
+    if ops:
+        result = db.orders.bulk_write(ops, ordered=False)
+        print(f"Set customer_search on {result.modified_count} orders")
+    else:
+        print("No orders missing customer_search")
+
+    db.orders.create_index(
+        [("store_id", 1), ("status", 1), ("createdAt", -1)],
+        name="store_status_createdAt_desc",
+    )
+    db.orders.create_index([("store_id", 1), ("customer_search", 1)], name="store_customer_search")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill order status/customer_search fields")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute customer_search on every order")
+    args = parser.parse_args()
+    backfill(rebuild=args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Backfill the denormalized product snapshot on rental_items.
+
+The rental list endpoints read product display fields (name, category, image,
+metal, purity, isRentable, status) from `rental_items.product` instead of
+joining `items`. Run this once after deploying, and again any time items were
+edited outside the API.
+"""
+
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateMany
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.blueprints.rentals.routes import PRODUCT_SNAPSHOT_FIELDS, build_product_snapshot  # noqa: E402
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "smartjewel")
+
+
+def backfill():
+    client = MongoClient(MONGODB_URI)
+    db = client[MONGO_DB_NAME]
+
+    product_ids = db.rental_items.distinct("product_id")
+    print(f"Found {len(product_ids)} products with rental items")
+
+    projection = {field: 1 for field in PRODUCT_SNAPSHOT_FIELDS}
+    ops = []
+    for product in db.items.find({"_id": {"$in": product_ids}}, projection):
+        snapshot = build_product_snapshot(product)
+        ops.append(UpdateMany({"product_id": product["_id"]}, {"$set": {"product": snapshot}}))
+
+    if ops:
+        result = db.rental_items.bulk_write(ops, ordered=False)
+        print(f"Updated {result.modified_count} rental items")
+    else:
+        print("Nothing to update")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,67 @@
+"""
+Backfill shift_schedules.dedupe_key on schedules created before it existed.
+
+create_shift_schedule upserts on dedupe_key (backed by the partial unique
+uniq_dedupe_key index), so a schedule without one is never matched and an
+identical schedule posted again is inserted as a duplicate. This sets the key
+on every schedule missing it. When legacy data already holds identical
+schedules, the first one gets the key and the others are listed and left
+without it for manual cleanup.
+"""
+
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.shift_schedules import SCHEDULE_KEY_FIELDS, schedule_dedupe_key  # noqa: E402
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "smartjewel")
+
+
+def backfill():
+    client = MongoClient(MONGODB_URI)
+    db = client[MONGO_DB_NAME]
+
+    db.shift_schedules.create_index(
+        [("dedupe_key", 1)],
+        name="uniq_dedupe_key",
+        unique=True,
+        partialFilterExpression={"dedupe_key": {"$type": "string"}},
+    )
+
+    # Keys already taken by schedules that have one
+    seen = {
+        doc["dedupe_key"]: doc["_id"]
+        for doc in db.shift_schedules.find({"dedupe_key": {"$type": "string"}}, {"dedupe_key": 1})
+    }
+
+    ops = []
+    duplicates = 0
+    projection = {"staff_id": 1, **{field: 1 for field in SCHEDULE_KEY_FIELDS}}
+    for schedule in db.shift_schedules.find({"dedupe_key": {"$not": {"$type": "string"}}}, projection):
+        key = schedule_dedupe_key(schedule)
+        if key in seen:
+            print(f"Schedule {schedule['_id']} duplicates {seen[key]}; left without dedupe_key")
+            duplicates += 1
+            continue
+        seen[key] = schedule["_id"]
+        ops.append(UpdateOne({"_id": schedule["_id"]}, {"$set": {"dedupe_key": key}}))
+
+    if ops:
+        result = db.shift_schedules.bulk_write(ops, ordered=False)
+        print(f"Set dedupe_key on {result.modified_count} schedules")
+    else:
+        print("No schedules missing dedupe_key")
+    if duplicates:
+        print(f"{duplicates} duplicate schedules need manual cleanup")
+    client.close()
+
+
+if __name__ == "__main__":
+    backfill()
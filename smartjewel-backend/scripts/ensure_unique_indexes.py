@@ -0,0 +1,104 @@
+"""
+Build the unique indexes the app relies on for duplicate checks.
+
+create_staff and create_store/update_store no longer look for an existing
+email or store name before writing; uniq_email and uniq_name_ci reject
+duplicates instead, and uniq_product_id keeps concurrent admin_create_rental
+calls from creating two rental items for one product. Until those indexes
+exist the app falls back to a pre-check and logs the failed build. A build
+fails when the collection already holds duplicates, or when a conflicting
+index on the same key exists. This reports both and builds each index once its
+duplicates are resolved. Duplicates are only listed, never removed; pass
+--drop-conflicting to drop the conflicting indexes.
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "smartjewel")
+
+NAME_COLLATION = {"locale": "en", "strength": 2}
+
+# (collection, field, index name, collation)
+UNIQUE_INDEXES = [
+    ("users", "email", "uniq_email", None),
+    ("stores", "name", "uniq_name_ci", NAME_COLLATION),
+    ("rental_items", "product_id", "uniq_product_id", None),
+]
+
+
+def find_duplicates(collection, field, collation):
+    pipeline = [
+        {"$match": {field: {"$exists": True}}},
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    kwargs = {"allowDiskUse": True}
+    if collation:
+        kwargs["collation"] = collation
+    return list(collection.aggregate(pipeline, **kwargs))
+
+
+def conflicting_indexes(collection, field, name, collation):
+    """Indexes that stop ours being built: same key and collation, but another
+    name, or our name without the unique option."""
+    locale = (collation or {}).get("locale")
+    return [
+        index_name
+        for index_name, spec in collection.index_information().items()
+        if spec["key"] == [(field, 1)]
+        and (spec.get("collation") or {}).get("locale") == locale
+        and (index_name != name or not spec.get("unique"))
+    ]
+
+
+def ensure(db, drop_conflicting=False):
+    ok = True
+    for coll_name, field, name, collation in UNIQUE_INDEXES:
+        collection = db[coll_name]
+
+        duplicates = find_duplicates(collection, field, collation)
+        for dup in duplicates:
+            ids = ", ".join(str(i) for i in dup["ids"])
+            print(f"{coll_name}: duplicate {field} {dup['_id']!r} on {dup['count']} documents: {ids}")
+
+        conflicts = conflicting_indexes(collection, field, name, collation)
+        for index_name in conflicts:
+            if drop_conflicting:
+                collection.drop_index(index_name)
+                print(f"{coll_name}: dropped conflicting index {index_name}")
+            else:
+                print(f"{coll_name}: conflicting index {index_name} (rerun with --drop-conflicting)")
+
+        if duplicates or (conflicts and not drop_conflicting):
+            print(f"{coll_name}: {name} not built")
+            ok = False
+            continue
+
+        kwargs = {"collation": collation} if collation else {}
+        collection.create_index([(field, 1)], name=name, unique=True, **kwargs)
+        print(f"{coll_name}: {name} ensured")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report duplicates and build the app's unique indexes")
+    parser.add_argument("--drop-conflicting", action="store_true",
+                        help="Drop conflicting indexes on the same key before building")
+    args = parser.parse_args()
+
+    client = MongoClient(MONGODB_URI)
+    ok = ensure(client[MONGO_DB_NAME], drop_conflicting=args.drop_conflicting)
+    client.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
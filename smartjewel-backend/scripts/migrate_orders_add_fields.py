@@ -20,7 +20,7 @@ load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "smartjewel")
 
-STATUS_DEFAULT = "Created"
+STATUS_DEFAULT = "created"
 
 
 def to_decimal(n: Any) -> Decimal:
@@ -61,6 +61,9 @@ booking_indexes = [
     
     # Query by payment status
     ([("payment_status", ASCENDING)], {"name": "idx_payment_status"}),
+    
+    # Refund processing filters on status + refunded flag
+    ([("booking_status", ASCENDING), ("deposit_refunded", ASCENDING)], {"name": "idx_status_refunded"}),
 ]
 
 for index_keys, index_options in booking_indexes:
@@ -77,6 +80,9 @@ payment_indexes = [
     
     # Query payments by customer
     ([("customer_id", ASCENDING), ("payment_date", DESCENDING)], {"name": "idx_customer_payments"}),
+    
+    # Query payments of a given type for a booking
+    ([("booking_id", ASCENDING), ("payment_type", ASCENDING)], {"name": "idx_booking_payment_type"}),
 ]
 
 for index_keys, index_options in payment_indexes: